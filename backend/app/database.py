@@ -2,18 +2,50 @@
 Database connection and session management.
 """
 
+import uuid
+from sqlalchemy import String, TypeDecorator, Uuid, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from .config import get_settings
 
 settings = get_settings()
 
+
+def _engine_options() -> dict:
+    """Build engine keyword arguments for the configured database backend."""
+    options = {
+        "echo": settings.debug,
+        "future": True,
+    }
+    
+    # Pool sizing and asyncpg connection options only apply to PostgreSQL;
+    # SQLite uses its own single-file pool.
+    if settings.database_url.startswith("postgresql"):
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            connect_args={
+                "command_timeout": settings.db_command_timeout,
+                "statement_cache_size": settings.db_statement_cache_size,
+                "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+                "server_settings": {
+                    "application_name": "archset",
+                    # Server-side timestamps (func.now()) are stored as naive UTC
+                    "timezone": "UTC",
+                    # Avoid JIT compilation stalls on short OLTP queries
+                    "jit": "off",
+                    "tcp_keepalives_idle": str(settings.db_tcp_keepalives_idle),
+                },
+            },
+        )
+    
+    return options
+
+
 # Create async engine
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True,
-)
+engine = create_async_engine(settings.database_url, **_engine_options())
 
 # Session factory
 async_session_maker = async_sessionmaker(
@@ -28,14 +60,66 @@ class Base(DeclarativeBase):
     pass
 
 
+class GUID(TypeDecorator):
+    """
+    UUID column type: native uuid on PostgreSQL, dashed VARCHAR(36) elsewhere.
+    
+    SQLAlchemy's Uuid stores 32-character hex on SQLite, which would not
+    match the dashed IDs already stored in existing SQLite databases.
+    """
+    
+    impl = String(36)
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(Uuid())
+        return dialect.type_descriptor(String(36))
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value if dialect.name == "postgresql" else str(value)
+    
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(value)
+
+
+# Columns added to existing tables after their first release; create_all only
+# builds missing tables, so init_db adds these to older databases
+_ADDED_COLUMNS = [
+    ("notes", "content_sha", "VARCHAR(64)"),
+]
+
+
+def _add_missing_columns(conn) -> None:
+    """Add _ADDED_COLUMNS that an existing database does not have yet."""
+    inspector = inspect(conn)
+    for table, column, ddl_type in _ADDED_COLUMNS:
+        existing = {col["name"] for col in inspector.get_columns(table)}
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
 async def init_db():
     """Initialize database tables."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
 
 async def get_db() -> AsyncSession:
-    """Dependency for getting database session."""
+    """
+    Dependency for getting database session.
+    
+    Declare it with Depends(get_db, scope="function") so the transaction is
+    committed and the connection returned to the pool as soon as the endpoint
+    returns, rather than after the response has been sent.
+    """
     async with async_session_maker() as session:
         try:
             yield session
@@ -5,14 +5,18 @@ Main entry point for the ArchSet diary application backend.
 Provides authentication, notes/folders management, and Gemini AI services.
 """
 
+import asyncio
+import logging
 import os
+import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
-from .config import get_settings
 from .config import get_settings
 from .database import init_db
+from .utils.responses import ORJSONResponse
 from .services.rag_service import rag_service
 from .routers import (
     auth_router,
@@ -25,6 +29,23 @@ from .routers import (
 
 settings = get_settings()
 
+logging.basicConfig(
+    level=logging.DEBUG if settings.debug else logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("archset")
+
+
+async def preload_whisper_model(ready: asyncio.Event) -> None:
+    """Download/load the Whisper model off the startup path, then signal readiness."""
+    from .services.whisper_service import WhisperService
+    try:
+        await asyncio.to_thread(WhisperService.ensure_model_downloaded)
+    except Exception as e:
+        logger.warning("Whisper model check failed: %s", e)
+    finally:
+        ready.set()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,25 +56,23 @@ async def lifespan(app: FastAPI):
     # Initialize RAG Service (Vector DB setup)
     await rag_service.initialize()
     
-    # Ensure Whisper model is downloaded (if online)
-    from .services.whisper_service import WhisperService
-    # Run in thread pool to not block async loop if it takes time (though it's startup)
-    import asyncio
-    try:
-        await asyncio.to_thread(WhisperService.ensure_model_downloaded)
-    except Exception as e:
-        print(f"Startup warning: Whisper model check failed: {e}")
+    # Ensure Whisper model is downloaded (if online) in the background, so the
+    # server starts accepting traffic without waiting for a multi-minute download
+    app.state.whisper_ready = asyncio.Event()
+    app.state.whisper_preload = asyncio.create_task(
+        preload_whisper_model(app.state.whisper_ready)
+    )
     
     # Create upload directory if it doesn't exist
     os.makedirs(settings.upload_dir, exist_ok=True)
     
-    print(f"🚀 ArchSet Backend started on {settings.host}:{settings.port}")
-    print(f"📚 API docs available at http://{settings.host}:{settings.port}/docs")
+    logger.info("🚀 ArchSet Backend started on %s:%s", settings.host, settings.port)
+    logger.info("📚 API docs available at http://%s:%s/docs", settings.host, settings.port)
     
     yield
     
     # Shutdown
-    print("👋 ArchSet Backend shutting down...")
+    logger.info("👋 ArchSet Backend shutting down...")
 
 
 # Create FastAPI app
@@ -72,6 +91,7 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -83,6 +103,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (note/folder lists, AI text) for mobile clients
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=4)
+
 # Include routers
 API_PREFIX = "/api/v1"
 
@@ -112,10 +135,15 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    # Production equivalent:
+    #   uvicorn app.main:app --loop uvloop --http httptools --workers N
     import uvicorn
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        workers=None if settings.debug else settings.workers,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
     )
@@ -4,26 +4,31 @@ Folder database model for organizing notes.
 
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, ForeignKey
+from sqlalchemy import String, DateTime, Boolean, ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from ..database import Base
+from ..database import Base, GUID
 
 
 class Folder(Base):
     """Folder model for organizing notes."""
     
     __tablename__ = "folders"
+    # Fetch server-generated timestamps via RETURNING instead of lazy-loading them
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Serves list_folders: filter by owner and deleted flag, ordered by creation
+        Index("ix_folders_user_active_created", "user_id", "is_deleted", "created_at"),
+    )
     
-    id: Mapped[str] = mapped_column(
-        String(36),
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID,
         primary_key=True,
-        default=lambda: str(uuid.uuid4())
+        default=uuid.uuid4
     )
-    user_id: Mapped[str] = mapped_column(
-        String(36),
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        GUID,
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True
+        nullable=False
     )
     name: Mapped[str] = mapped_column(
         String(255),
@@ -35,21 +40,21 @@ class Folder(Base):
     )
     created_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.utcnow,
-        onupdate=datetime.utcnow
+        server_default=func.now(),
+        onupdate=func.now()
     )
     is_deleted: Mapped[bool] = mapped_column(
         Boolean,
         default=False
     )
     
-    # Relationships
-    user = relationship("User", back_populates="folders")
-    notes = relationship("Note", back_populates="folder")
+    # Relationships (never lazy-load on the async session; use selectinload)
+    user = relationship("User", back_populates="folders", lazy="raise_on_sql")
+    notes = relationship("Note", back_populates="folder", lazy="raise_on_sql")
     
     def __repr__(self) -> str:
         return f"<Folder(id={self.id}, name={self.name})>"
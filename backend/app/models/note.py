@@ -2,31 +2,39 @@
 Note database model for diary entries.
 """
 
+import hashlib
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import String, DateTime, Boolean, ForeignKey, Index, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from ..database import Base
+from ..database import Base, GUID
 
 
 class Note(Base):
     """Note model for diary entries."""
     
     __tablename__ = "notes"
+    # Fetch server-generated timestamps via RETURNING instead of lazy-loading them
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Serve list_notes (WHERE user_id, is_deleted [, folder_id] ORDER BY date DESC)
+        # as index range scans; B-tree indexes are read backwards for DESC.
+        Index("ix_notes_user_active_date", "user_id", "is_deleted", "date"),
+        Index("ix_notes_user_folder_active_date", "user_id", "folder_id", "is_deleted", "date"),
+    )
     
-    id: Mapped[str] = mapped_column(
-        String(36),
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID,
         primary_key=True,
-        default=lambda: str(uuid.uuid4())
+        default=uuid.uuid4
     )
-    user_id: Mapped[str] = mapped_column(
-        String(36),
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        GUID,
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True
+        nullable=False
     )
-    folder_id: Mapped[str | None] = mapped_column(
-        String(36),
+    folder_id: Mapped[uuid.UUID | None] = mapped_column(
+        GUID,
         ForeignKey("folders.id", ondelete="SET NULL"),
         nullable=True,
         index=True
@@ -47,16 +55,21 @@ class Note(Base):
     )
     date: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.utcnow
+        server_default=func.now()
     )
     created_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.utcnow,
-        onupdate=datetime.utcnow
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+    # SHA-256 of the indexed text (see content_digest); NULL when unknown
+    content_sha: Mapped[str | None] = mapped_column(
+        String(64),
+        nullable=True
     )
     synced_at: Mapped[datetime | None] = mapped_column(
         DateTime,
@@ -67,9 +80,14 @@ class Note(Base):
         default=False
     )
     
-    # Relationships
-    user = relationship("User", back_populates="notes")
-    folder = relationship("Folder", back_populates="notes")
+    # Relationships (never lazy-load on the async session; use selectinload)
+    user = relationship("User", back_populates="notes", lazy="raise_on_sql")
+    folder = relationship("Folder", back_populates="notes", lazy="raise_on_sql")
+    
+    @staticmethod
+    def content_digest(title: str | None, content: str | None) -> str:
+        """Hash the title and content, i.e. exactly what gets embedded for the vector DB."""
+        return hashlib.sha256(f"{title or ''}\0{content or ''}".encode("utf-8")).hexdigest()
     
     def __repr__(self) -> str:
         return f"<Note(id={self.id}, title={self.title[:30] if self.title else 'Untitled'})>"
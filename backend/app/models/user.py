@@ -6,7 +6,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy import String, DateTime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from ..database import Base
+from ..database import Base, GUID
 
 
 class User(Base):
@@ -14,10 +14,10 @@ class User(Base):
     
     __tablename__ = "users"
     
-    id: Mapped[str] = mapped_column(
-        String(36),
+    id: Mapped[uuid.UUID] = mapped_column(
+        GUID,
         primary_key=True,
-        default=lambda: str(uuid.uuid4())
+        default=uuid.uuid4
     )
     email: Mapped[str] = mapped_column(
         String(255),
@@ -39,9 +39,22 @@ class User(Base):
         onupdate=datetime.utcnow
     )
     
-    # Relationships
-    folders = relationship("Folder", back_populates="user", cascade="all, delete-orphan")
-    notes = relationship("Note", back_populates="user", cascade="all, delete-orphan")
+    # Relationships (never lazy-load on the async session; use selectinload).
+    # passive_deletes leaves child removal to the ON DELETE CASCADE foreign keys.
+    folders = relationship(
+        "Folder",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise_on_sql"
+    )
+    notes = relationship(
+        "Note",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise_on_sql"
+    )
     
     def __repr__(self) -> str:
         return f"<User(id={self.id}, email={self.email})>"
@@ -2,8 +2,9 @@
 AI Chat API endpoints.
 """
 
-from typing import List, Dict, Any
+from typing import AsyncIterable, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.sse import EventSourceResponse
 from pydantic import BaseModel
 
 from ..services.rag_service import rag_service
@@ -39,7 +40,7 @@ async def chat_with_diary(
         response_text = await rag_service.chat_with_diary(
             user_query=request.query,
             chat_history=request.history,
-            user_id=current_user.id
+            user_id=str(current_user.id)
         )
         
         return ChatResponse(
@@ -52,3 +53,29 @@ async def chat_with_diary(
             success=False,
             error=str(e)
         )
+
+
+def require_query(request: ChatRequest) -> ChatRequest:
+    """Reject empty queries before a streaming response has started."""
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    return request
+
+
+@router.post("/chat/stream", response_class=EventSourceResponse)
+async def stream_chat_with_diary(
+    request: ChatRequest = Depends(require_query),
+    current_user: User = Depends(get_current_user)
+) -> AsyncIterable[str]:
+    """
+    Chat with the user's diary using RAG, streaming the answer.
+    
+    Sent as Server-Sent Events; each event's data is the next piece of the
+    answer as a JSON string.
+    """
+    async for token in rag_service.achat_stream(
+        user_query=request.query,
+        chat_history=request.history,
+        user_id=str(current_user.id)
+    ):
+        yield token
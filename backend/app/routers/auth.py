@@ -4,6 +4,7 @@ Authentication API endpoints.
 
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
 
 from ..database import get_db
 from ..schemas.auth import (
@@ -15,15 +16,18 @@ from ..schemas.auth import (
 )
 from ..services.auth_service import AuthService
 from ..utils.security import get_current_user
+from ..utils.responses import json_response
 from ..models.user import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+_USER_ADAPTER = TypeAdapter(UserResponse)
+
 
 @router.post("/register", response_model=UserResponse, status_code=201)
 async def register(
     user_data: UserRegister,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Register a new user account.
@@ -38,7 +42,7 @@ async def register(
 @router.post("/login", response_model=Token)
 async def login(
     login_data: UserLogin,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Authenticate and get access tokens.
@@ -52,7 +56,7 @@ async def login(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     token_data: TokenRefresh,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Refresh access token using refresh token.
@@ -72,4 +76,4 @@ async def get_current_user_info(
     
     Requires valid JWT access token in Authorization header.
     """
-    return UserResponse.model_validate(current_user)
+    return json_response(_USER_ADAPTER, current_user)
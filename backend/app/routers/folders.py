@@ -2,11 +2,13 @@
 Folders API endpoints.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime
+from sqlalchemy import select, insert, update, delete, text
+from pydantic import TypeAdapter
 
 from ..database import get_db
 from ..models.folder import Folder
@@ -14,66 +16,156 @@ from ..models.note import Note
 from ..models.user import User
 from ..schemas.folder import FolderCreate, FolderUpdate, FolderResponse
 from ..utils.security import get_current_user
+from ..utils.responses import json_response
 
 router = APIRouter(prefix="/folders", tags=["Folders"])
 
+_FOLDER_ADAPTER = TypeAdapter(FolderResponse)
+_FOLDER_LIST_ADAPTER = TypeAdapter(List[FolderResponse])
+
+# On PostgreSQL, folder listings are serialized to JSON by the database itself,
+# skipping ORM hydration and per-row Pydantic validation. Column names match
+# FolderResponse, and the result is cast to text so it is returned verbatim.
+_FOLDER_COLUMNS = "id, user_id, name, color, created_at, updated_at, is_deleted"
+
+_LIST_FOLDERS_JSON = text(f"""
+    SELECT coalesce(json_agg(f ORDER BY f.created_at), '[]'::json)::text
+    FROM (
+        SELECT {_FOLDER_COLUMNS}
+        FROM folders
+        WHERE user_id = :user_id AND (:include_deleted OR is_deleted = false)
+    ) f
+""")
+
+_GET_FOLDER_JSON = text(f"""
+    SELECT row_to_json(f)::text
+    FROM (
+        SELECT {_FOLDER_COLUMNS}
+        FROM folders
+        WHERE id = :folder_id AND user_id = :user_id
+    ) f
+""")
+
+
+def _is_postgres(db: AsyncSession) -> bool:
+    """Check whether the session is bound to a PostgreSQL database."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _folders_etag(body: bytes) -> str:
+    """
+    Build a weak ETag for a user's folder list.
+    
+    The tag hashes the serialized listing itself, so it changes whenever any
+    returned row does (including sync upserts that carry an older client
+    updated_at, and edits within the database clock's resolution).
+    """
+    digest = hashlib.md5(body, usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Check an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
 
 @router.get("", response_model=List[FolderResponse])
 async def list_folders(
+    request: Request,
     include_deleted: bool = False,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Get all folders for the current user.
     
+    Responses carry an ETag; send it back as If-None-Match to get
+    304 Not Modified when nothing changed.
+    
     - **include_deleted**: Include soft-deleted folders (for sync)
     """
-    query = select(Folder).where(Folder.user_id == current_user.id)
-    
-    if not include_deleted:
-        query = query.where(Folder.is_deleted == False)
-    
-    query = query.order_by(Folder.created_at.asc())
-    
-    result = await db.execute(query)
-    folders = result.scalars().all()
-    
-    return [FolderResponse.model_validate(folder) for folder in folders]
+    if _is_postgres(db):
+        result = await db.execute(
+            _LIST_FOLDERS_JSON,
+            {"user_id": current_user.id, "include_deleted": include_deleted}
+        )
+        response = Response(content=result.scalar_one(), media_type="application/json")
+    else:
+        query = select(Folder).where(Folder.user_id == current_user.id)
+        
+        if not include_deleted:
+            query = query.where(Folder.is_deleted == False)
+        
+        query = query.order_by(Folder.created_at.asc())
+        
+        result = await db.execute(query)
+        folders = result.scalars().all()
+        
+        response = json_response(_FOLDER_LIST_ADAPTER, folders)
+    
+    # Folder lists are small, so hashing the body is cheaper than any
+    # bookkeeping that would let us skip the query
+    etag = _folders_etag(response.body)
+    
+    if _etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return response
 
 
 @router.post("", response_model=FolderResponse, status_code=201)
 async def create_folder(
     folder_data: FolderCreate,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Create a new folder.
     
     The folder ID can be specified by the client for sync purposes.
     """
-    folder = Folder(
-        id=folder_data.id if folder_data.id else None,
+    values = dict(
         user_id=current_user.id,
         name=folder_data.name,
         color=folder_data.color
     )
+    if folder_data.id:
+        values["id"] = folder_data.id
     
-    db.add(folder)
+    # RETURNING hands back server defaults (created_at, updated_at) without a refresh
+    result = await db.execute(insert(Folder).values(**values).returning(Folder))
+    folder = result.scalar_one()
     await db.commit()
-    await db.refresh(folder)
     
-    return FolderResponse.model_validate(folder)
+    return json_response(_FOLDER_ADAPTER, folder, status_code=201)
 
 
 @router.get("/{folder_id}", response_model=FolderResponse)
 async def get_folder(
-    folder_id: str,
+    folder_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """Get a specific folder by ID."""
+    if _is_postgres(db):
+        result = await db.execute(
+            _GET_FOLDER_JSON,
+            {"folder_id": folder_id, "user_id": current_user.id}
+        )
+        folder_json = result.scalar_one_or_none()
+        
+        if folder_json is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Folder not found"
+            )
+        
+        return Response(content=folder_json, media_type="application/json")
+    
     result = await db.execute(
         select(Folder).where(
             Folder.id == folder_id,
@@ -88,22 +180,24 @@ async def get_folder(
             detail="Folder not found"
         )
     
-    return FolderResponse.model_validate(folder)
+    return json_response(_FOLDER_ADAPTER, folder)
 
 
 @router.put("/{folder_id}", response_model=FolderResponse)
 async def update_folder(
-    folder_id: str,
+    folder_id: UUID,
     folder_data: FolderUpdate,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """Update an existing folder."""
     result = await db.execute(
-        select(Folder).where(
+        update(Folder).where(
             Folder.id == folder_id,
             Folder.user_id == current_user.id
-        )
+        ).values(
+            **folder_data.model_dump(exclude_none=True)
+        ).returning(Folder)
     )
     folder = result.scalar_one_or_none()
     
@@ -113,23 +207,17 @@ async def update_folder(
             detail="Folder not found"
         )
     
-    if folder_data.name is not None:
-        folder.name = folder_data.name
-    if folder_data.color is not None:
-        folder.color = folder_data.color
-    
     await db.commit()
-    await db.refresh(folder)
     
-    return FolderResponse.model_validate(folder)
+    return json_response(_FOLDER_ADAPTER, folder)
 
 
 @router.delete("/{folder_id}", status_code=204)
 async def delete_folder(
-    folder_id: str,
+    folder_id: UUID,
     hard_delete: bool = False,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Delete a folder.
@@ -138,35 +226,30 @@ async def delete_folder(
     
     - **hard_delete**: If true, permanently delete. Otherwise soft delete.
     """
+    if hard_delete:
+        folder_stmt = delete(Folder)
+    else:
+        folder_stmt = update(Folder).values(is_deleted=True)
+    
     result = await db.execute(
-        select(Folder).where(
+        folder_stmt.where(
             Folder.id == folder_id,
             Folder.user_id == current_user.id
-        )
+        ).returning(Folder.id)
     )
-    folder = result.scalar_one_or_none()
     
-    if not folder:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Folder not found"
         )
     
     # Move notes to "All Notes" (uncategorized)
-    notes_result = await db.execute(
-        select(Note).where(
+    await db.execute(
+        update(Note).where(
             Note.folder_id == folder_id,
             Note.user_id == current_user.id
-        )
+        ).values(folder_id=None)
     )
-    notes = notes_result.scalars().all()
-    for note in notes:
-        note.folder_id = None
-    
-    if hard_delete:
-        await db.delete(folder)
-    else:
-        folder.is_deleted = True
-        folder.updated_at = datetime.utcnow()
     
     await db.commit()
@@ -3,20 +3,91 @@ Gemini AI API endpoints for transcription and text rewriting.
 """
 
 import os
+import tempfile
 import aiofiles
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import aiofiles.os
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
 from pydantic import BaseModel
 from typing import Optional
 
-from ..services.gemini_service import get_gemini_service, GeminiService
+from ..services.gemini_service import get_gemini_service, GeminiService, AUDIO_MIME_TYPES
 from ..utils.security import get_current_user
 from ..models.user import User
-from ..config import get_settings
-
-settings = get_settings()
+from ..config import Settings, get_settings
 
 router = APIRouter(prefix="/gemini", tags=["Gemini AI"])
 
+# Uploads are copied to disk in chunks of this size
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Supported upload types, keyed by lowercase file extension
+_AUDIO_MIME_TYPES = AUDIO_MIME_TYPES
+_IMAGE_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".heic": "image/heic",
+}
+_AUDIO_EXTENSIONS = frozenset(_AUDIO_MIME_TYPES)
+_IMAGE_EXTENSIONS = frozenset(_IMAGE_MIME_TYPES)
+_AUDIO_TYPE_ERROR = f"Unsupported file type. Allowed: {', '.join(_AUDIO_MIME_TYPES)}"
+_IMAGE_TYPE_ERROR = f"Unsupported file type. Allowed: {', '.join(_IMAGE_MIME_TYPES)}"
+
+
+def _file_extension(filename: Optional[str]) -> str:
+    """Return the lowercase extension of a filename including the dot, or ""."""
+    if not filename:
+        return ""
+    _, dot, ext = filename.rpartition(".")
+    return f".{ext.lower()}" if dot else ""
+
+
+async def _save_upload_to_temp(file: UploadFile, suffix: str, max_size_mb: int) -> str:
+    """
+    Stream an uploaded file to a temporary file, enforcing the size limit.
+    
+    The upload is copied in chunks so memory stays bounded, and oversized
+    files are rejected as soon as the limit is crossed.
+    
+    Returns:
+        Path to the temporary file. The caller is responsible for removing it.
+    """
+    max_size = max_size_mb * 1024 * 1024
+    too_large = HTTPException(
+        status_code=400,
+        detail=f"File too large. Maximum size: {max_size_mb}MB"
+    )
+    
+    # Reject early when the client declared the size up front
+    if file.size is not None and file.size > max_size:
+        raise too_large
+    
+    fd, temp_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    
+    try:
+        size = 0
+        async with aiofiles.open(temp_path, "wb") as out:
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise too_large
+                await out.write(chunk)
+    except BaseException:
+        await _remove_temp_file(temp_path)
+        raise
+    
+    return temp_path
+
+
+async def _remove_temp_file(path: str) -> None:
+    """Remove a temporary upload file, ignoring errors."""
+    try:
+        await aiofiles.os.remove(path)
+    except OSError:
+        pass
+
 
 class TranscriptionResponse(BaseModel):
     """Response for audio transcription."""
@@ -47,9 +118,11 @@ class ImageAnalysisResponse(BaseModel):
 
 @router.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
+    request: Request,
     file: UploadFile = File(..., description="Audio file to transcribe"),
     current_user: User = Depends(get_current_user),
-    gemini: GeminiService = Depends(get_gemini_service)
+    gemini: GeminiService = Depends(get_gemini_service),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Transcribe an audio file to text using Gemini AI.
@@ -59,38 +132,26 @@ async def transcribe_audio(
     Maximum file size: 50MB
     """
     # Validate file type
-    allowed_extensions = {".m4a", ".mp3", ".wav", ".webm", ".ogg"}
-    file_ext = os.path.splitext(file.filename)[1].lower() if file.filename else ""
+    file_ext = _file_extension(file.filename)
     
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
-        )
+    if file_ext not in _AUDIO_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=_AUDIO_TYPE_ERROR)
     
-    # Check file size
-    max_size = settings.max_upload_size_mb * 1024 * 1024
-    content = await file.read()
+    # Without Gemini, offline Whisper is the only path, so wait for the
+    # startup preload instead of blocking on the model load mid-request
+    whisper_ready = getattr(request.app.state, "whisper_ready", None)
+    if gemini.model is None and whisper_ready is not None:
+        await whisper_ready.wait()
     
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB"
-        )
+    # Stream to disk (also enforces the size limit)
+    temp_path = await _save_upload_to_temp(file, file_ext, settings.max_upload_size_mb)
     
     # Determine MIME type
-    mime_types = {
-        ".m4a": "audio/mp4",
-        ".mp3": "audio/mpeg",
-        ".wav": "audio/wav",
-        ".webm": "audio/webm",
-        ".ogg": "audio/ogg",
-    }
-    mime_type = mime_types.get(file_ext, "audio/mpeg")
+    mime_type = _AUDIO_MIME_TYPES[file_ext]
     
     try:
         # Transcribe using Gemini
-        text = await gemini.transcribe_audio_bytes(content, mime_type)
+        text = await gemini.transcribe_audio_file(temp_path, mime_type)
         
         if text:
             return TranscriptionResponse(text=text, success=True)
@@ -106,6 +167,8 @@ async def transcribe_audio(
             success=False,
             error=f"Transcription error: {str(e)}"
         )
+    finally:
+        await _remove_temp_file(temp_path)
 
 
 @router.post("/rewrite", response_model=RewriteResponse)
@@ -160,7 +223,8 @@ async def analyze_image(
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
     current_user: User = Depends(get_current_user),
-    gemini: GeminiService = Depends(get_gemini_service)
+    gemini: GeminiService = Depends(get_gemini_service),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Analyze an archaeological image using Gemini AI.
@@ -169,38 +233,20 @@ async def analyze_image(
     Optionally providing latitude and longitude helps refine the spatial context.
     """
     # Validate file type
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".webp", ".heic"}
-    file_ext = os.path.splitext(file.filename)[1].lower() if file.filename else ""
+    file_ext = _file_extension(file.filename)
     
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
-        )
+    if file_ext not in _IMAGE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=_IMAGE_TYPE_ERROR)
     
-    # Check file size (reuse settings max size)
-    max_size = settings.max_upload_size_mb * 1024 * 1024
-    content = await file.read()
-    
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB"
-        )
+    # Stream to disk (also enforces the size limit)
+    temp_path = await _save_upload_to_temp(file, file_ext, settings.max_upload_size_mb)
     
     # Determine MIME type
-    mime_types = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".webp": "image/webp",
-        ".heic": "image/heic",
-    }
-    mime_type = mime_types.get(file_ext, "image/jpeg")
+    mime_type = _IMAGE_MIME_TYPES[file_ext]
     
     try:
-        analysis_json = await gemini.analyze_image_bytes(
-            content, 
+        analysis_json = await gemini.analyze_image_file(
+            temp_path,
             mime_type,
             latitude=latitude,
             longitude=longitude
@@ -220,49 +266,34 @@ async def analyze_image(
             success=False,
             error=f"Analysis error: {str(e)}"
         )
+    finally:
+        await _remove_temp_file(temp_path)
 
 
 @router.post("/ocr", response_model=TranscriptionResponse)
 async def extract_text(
     file: UploadFile = File(..., description="Image file to scan"),
     current_user: User = Depends(get_current_user),
-    gemini: GeminiService = Depends(get_gemini_service)
+    gemini: GeminiService = Depends(get_gemini_service),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Extract text from an image (OCR).
     """
     # Validate file type
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".webp", ".heic"}
-    file_ext = os.path.splitext(file.filename)[1].lower() if file.filename else ""
-    
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
-        )
+    file_ext = _file_extension(file.filename)
     
-    # Check file size (reuse settings max size)
-    max_size = settings.max_upload_size_mb * 1024 * 1024
-    content = await file.read()
+    if file_ext not in _IMAGE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=_IMAGE_TYPE_ERROR)
     
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB"
-        )
+    # Stream to disk (also enforces the size limit)
+    temp_path = await _save_upload_to_temp(file, file_ext, settings.max_upload_size_mb)
     
     # Determine MIME type
-    mime_types = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".webp": "image/webp",
-        ".heic": "image/heic",
-    }
-    mime_type = mime_types.get(file_ext, "image/jpeg")
+    mime_type = _IMAGE_MIME_TYPES[file_ext]
     
     try:
-        text = await gemini.extract_text_from_image(content, mime_type)
+        text = await gemini.extract_text_from_image_file(temp_path, mime_type)
         
         if text:
             return TranscriptionResponse(text=text, success=True)
@@ -278,3 +309,5 @@ async def extract_text(
             success=False,
             error=f"OCR error: {str(e)}"
         )
+    finally:
+        await _remove_temp_file(temp_path)
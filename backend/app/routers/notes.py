@@ -2,30 +2,36 @@
 Notes API endpoints.
 """
 
-from typing import List
+from typing import List, Optional
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, delete, or_
 from datetime import datetime
+from pydantic import TypeAdapter
 
 from ..database import get_db
-import os
+import aiofiles.os
 from ..models.note import Note
 from ..models.user import User
 from ..models.folder import Folder
 from ..schemas.note import NoteCreate, NoteUpdate, NoteResponse
 from ..utils.security import get_current_user
-from ..services.rag_service import rag_service
+from ..utils.responses import json_response, trusted_json_response
+from ..worker import enqueue_diary_sync
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
+_NOTE_ADAPTER = TypeAdapter(NoteResponse)
+_NOTE_LIST_ADAPTER = TypeAdapter(List[NoteResponse])
+
 
 @router.get("", response_model=List[NoteResponse])
 async def list_notes(
     include_deleted: bool = False,
-    folder_id: str = None,
+    folder_id: Optional[UUID] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Get all notes for the current user.
@@ -46,7 +52,7 @@ async def list_notes(
     result = await db.execute(query)
     notes = result.scalars().all()
     
-    return [NoteResponse.model_validate(note) for note in notes]
+    return json_response(_NOTE_LIST_ADAPTER, notes)
 
 
 @router.post("", response_model=NoteResponse, status_code=201)
@@ -54,46 +60,49 @@ async def create_note(
     note_data: NoteCreate,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Create a new note.
     
     The note ID can be specified by the client for sync purposes.
     """
-    note = Note(
-        id=note_data.id if note_data.id else None,
+    values = dict(
         user_id=current_user.id,
         title=note_data.title,
         content=note_data.content,
         folder_id=note_data.folder_id,
         audio_path=note_data.audio_path,
+        content_sha=Note.content_digest(note_data.title, note_data.content),
         date=note_data.date or datetime.utcnow(),
         synced_at=datetime.utcnow()
     )
+    if note_data.id:
+        values["id"] = note_data.id
     
-    db.add(note)
+    # RETURNING hands back server defaults (created_at, updated_at) without a refresh
+    result = await db.execute(insert(Note).values(**values).returning(Note))
+    note = result.scalar_one()
     await db.commit()
-    await db.refresh(note)
     
     # Sync to vector DB
     if note.content:
-        background_tasks.add_task(
-            rag_service.sync_diary_to_vector_db,
-            note_id=note.id,
+        await enqueue_diary_sync(
+            background_tasks,
+            note_id=str(note.id),
             text=note.content,
-            user_id=current_user.id,
+            user_id=str(current_user.id),
             title=note.title
         )
     
-    return NoteResponse.model_validate(note)
+    return trusted_json_response(NoteResponse, note, status_code=201)
 
 
 @router.get("/{note_id}", response_model=NoteResponse)
 async def get_note(
-    note_id: str,
+    note_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """Get a specific note by ID."""
     result = await db.execute(
@@ -110,25 +119,64 @@ async def get_note(
             detail="Note not found"
         )
     
-    return NoteResponse.model_validate(note)
+    return json_response(_NOTE_ADAPTER, note)
 
 
 @router.put("/{note_id}", response_model=NoteResponse)
 async def update_note(
-    note_id: str,
+    note_id: UUID,
     note_data: NoteUpdate,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
-    """Update an existing note."""
-    result = await db.execute(
-        select(Note).where(
-            Note.id == note_id,
-            Note.user_id == current_user.id
+    """
+    Update an existing note.
+    
+    Saves that would not change anything (e.g. autosave of unchanged text)
+    skip the write and the vector-DB re-index.
+    """
+    changes = note_data.model_dump(exclude_none=True)
+    note = None
+    
+    # Keep the content hash in step with the indexed text; on a partial edit
+    # the other field is not known here, so the hash is cleared instead
+    text_changes = {"title", "content"} & changes.keys()
+    if text_changes:
+        content_sha = None
+        if len(text_changes) == 2:
+            content_sha = Note.content_digest(changes["title"], changes["content"])
+    
+    if changes:
+        # Apply only the provided fields, and only if one of them differs,
+        # reading the row back in the same round-trip
+        result = await db.execute(
+            update(Note).where(
+                Note.id == note_id,
+                Note.user_id == current_user.id,
+                or_(*(
+                    getattr(Note, field).is_distinct_from(value)
+                    for field, value in changes.items()
+                ))
+            ).values(
+                **changes,
+                **({"content_sha": content_sha} if text_changes else {}),
+                synced_at=datetime.utcnow()
+            ).returning(Note)
         )
-    )
-    note = result.scalar_one_or_none()
+        note = result.scalar_one_or_none()
+    
+    changed = note is not None
+    
+    if not changed:
+        # Nothing to write (or no such note): return the stored row as-is
+        result = await db.execute(
+            select(Note).where(
+                Note.id == note_id,
+                Note.user_id == current_user.id
+            )
+        )
+        note = result.scalar_one_or_none()
     
     if not note:
         raise HTTPException(
@@ -136,57 +184,46 @@ async def update_note(
             detail="Note not found"
         )
     
-    # Update fields if provided
-    if note_data.title is not None:
-        note.title = note_data.title
-    if note_data.content is not None:
-        note.content = note_data.content
-    if note_data.folder_id is not None:
-        note.folder_id = note_data.folder_id
-    if note_data.audio_path is not None:
-        note.audio_path = note_data.audio_path
-    if note_data.date is not None:
-        note.date = note_data.date
-    
-    note.synced_at = datetime.utcnow()
-    
-    await db.commit()
-    await db.refresh(note)
-    
-    # Sync to vector DB if content or title changed
-    if (note_data.content is not None) or (note_data.title is not None):
-        background_tasks.add_task(
-            rag_service.sync_diary_to_vector_db,
-            note_id=note.id,
-            text=note.content if note_data.content is not None else note.content,
-            user_id=current_user.id,
+    # Sync to vector DB if content or title changed, once the update is committed
+    if changed and ((note_data.content is not None) or (note_data.title is not None)):
+        await db.commit()
+        await enqueue_diary_sync(
+            background_tasks,
+            note_id=str(note.id),
+            text=note.content,
+            user_id=str(current_user.id),
             title=note.title
         )
     
-    return NoteResponse.model_validate(note)
+    return trusted_json_response(NoteResponse, note)
 
 
 @router.delete("/{note_id}", status_code=204)
 async def delete_note(
-    note_id: str,
+    note_id: UUID,
     hard_delete: bool = False,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Delete a note.
     
     - **hard_delete**: If true, permanently delete. Otherwise soft delete.
     """
+    if hard_delete:
+        note_stmt = delete(Note)
+    else:
+        note_stmt = update(Note).values(is_deleted=True)
+    
     result = await db.execute(
-        select(Note).where(
+        note_stmt.where(
             Note.id == note_id,
             Note.user_id == current_user.id
-        )
+        ).returning(Note.id, Note.audio_path)
     )
-    note = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not note:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note not found"
@@ -194,18 +231,13 @@ async def delete_note(
     
     if hard_delete:
         # Delete associated media files
-        if note.audio_path and os.path.exists(note.audio_path):
+        if row.audio_path:
             try:
-                os.remove(note.audio_path)
+                await aiofiles.os.remove(row.audio_path)
             except OSError:
                 pass  # Ignore if file not found or other error
 
         # TODO: Parse note.content (JSON/Delta) to find and delete images
         # For now, we only handle audio as it's the primary external file
-
-        await db.delete(note)
-    else:
-        note.is_deleted = True
-        note.updated_at = datetime.utcnow()
     
     await db.commit()
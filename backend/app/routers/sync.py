@@ -3,24 +3,56 @@ Sync API endpoint for offline-first synchronization.
 """
 
 from datetime import datetime
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, BackgroundTasks, Request, Response
+from fastapi.exceptions import RequestValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 
 from ..database import get_db
 from ..models.user import User
-from ..schemas.note import SyncRequest, SyncResponse
+from ..schemas.note import SyncResponse, SYNC_REQUEST_ADAPTER, SYNC_RESPONSE_ADAPTER
 from ..services.sync_service import SyncService
 from ..utils.security import get_current_user
+from ..worker import enqueue_diary_sync_batch
 
 router = APIRouter(prefix="/sync", tags=["Synchronization"])
 
 
-@router.post("", response_model=SyncResponse)
+def _inline_schema(schema: dict) -> dict:
+    """Resolve local $defs references so a schema can be embedded in OpenAPI."""
+    defs = schema.pop("$defs", {})
+    
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+    
+    return resolve(schema)
+
+
+# The body is parsed by hand (see sync_data), so document it explicitly
+_SYNC_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": _inline_schema(SYNC_REQUEST_ADAPTER.json_schema())
+            }
+        },
+    }
+}
+
+
+@router.post("", response_model=SyncResponse, openapi_extra=_SYNC_REQUEST_BODY)
 async def sync_data(
-    sync_request: SyncRequest,
+    request: Request,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
     Synchronize local data with server.
@@ -37,25 +69,42 @@ async def sync_data(
     **Deleted Items**: Items with `is_deleted: true` will be soft-deleted
     on the server. Clients should hide these but keep them for sync.
     """
-    service = SyncService(db)
+    # Validate straight from the raw bytes, skipping the json.loads() dict
+    try:
+        sync_request = SYNC_REQUEST_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
     
-    # Sync notes
-    synced_notes = await service.sync_notes(
-        user=current_user,
-        client_notes=sync_request.notes,
-        last_sync_at=sync_request.last_sync_at,
-        background_tasks=background_tasks
-    )
-    
-    # Sync folders
+    # Notes and folders are applied in one transaction, folders first so
+    # notes can reference folders created in the same sync. (An AsyncSession
+    # cannot run statements concurrently, so the two halves run in sequence.)
+    service = SyncService(db)
     synced_folders = await service.sync_folders(
         user=current_user,
         client_folders=sync_request.folders,
         last_sync_at=sync_request.last_sync_at
     )
+    synced_notes, entries = await service.sync_notes(
+        user=current_user,
+        client_notes=sync_request.notes,
+        last_sync_at=sync_request.last_sync_at
+    )
+    await db.commit()
+    
+    # Index only what was committed, as one batched job for the whole sync
+    await enqueue_diary_sync_batch(background_tasks, entries)
     
-    return SyncResponse(
+    sync_response = SyncResponse(
         notes=synced_notes,
         folders=synced_folders,
         sync_timestamp=datetime.utcnow()
     )
+    
+    # Already validated; serialize once in pydantic-core
+    return Response(
+        content=SYNC_RESPONSE_ADAPTER.dump_json(sync_response),
+        media_type="application/json"
+    )
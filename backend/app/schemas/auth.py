@@ -4,6 +4,7 @@ Authentication schemas for request/response validation.
 
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
+from uuid import UUID
 
 
 class UserRegister(BaseModel):
@@ -32,7 +33,7 @@ class TokenRefresh(BaseModel):
 
 class UserResponse(BaseModel):
     """User data response."""
-    id: str
+    id: UUID
     email: str
     created_at: datetime
     
@@ -5,6 +5,7 @@ Folder schemas for request/response validation.
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
+from uuid import UUID
 
 
 class FolderBase(BaseModel):
@@ -15,7 +16,7 @@ class FolderBase(BaseModel):
 
 class FolderCreate(FolderBase):
     """Schema for creating a folder."""
-    id: Optional[str] = None  # Allow client to specify ID for sync
+    id: Optional[UUID] = None  # Allow client to specify ID for sync
 
 
 class FolderUpdate(BaseModel):
@@ -26,8 +27,8 @@ class FolderUpdate(BaseModel):
 
 class FolderResponse(FolderBase):
     """Folder response with all fields."""
-    id: str
-    user_id: str
+    id: UUID
+    user_id: UUID
     created_at: datetime
     updated_at: datetime
     is_deleted: bool = False
@@ -38,7 +39,7 @@ class FolderResponse(FolderBase):
 
 class FolderSyncItem(BaseModel):
     """Folder data for sync operations."""
-    id: str
+    id: UUID
     name: str
     color: str = "#E8B731"
     updated_at: datetime
@@ -2,38 +2,39 @@
 Note schemas for request/response validation.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
 from typing import Optional, List
+from uuid import UUID
 
 
 class NoteBase(BaseModel):
     """Base note fields."""
     title: str = ""
     content: str = ""
-    folder_id: Optional[str] = None
+    folder_id: Optional[UUID] = None
     audio_path: Optional[str] = None
     date: Optional[datetime] = None
 
 
 class NoteCreate(NoteBase):
     """Schema for creating a note."""
-    id: Optional[str] = None  # Allow client to specify ID for sync
+    id: Optional[UUID] = None  # Allow client to specify ID for sync
 
 
 class NoteUpdate(BaseModel):
     """Schema for updating a note."""
     title: Optional[str] = None
     content: Optional[str] = None
-    folder_id: Optional[str] = None
+    folder_id: Optional[UUID] = None
     audio_path: Optional[str] = None
     date: Optional[datetime] = None
 
 
 class NoteResponse(NoteBase):
     """Note response with all fields."""
-    id: str
-    user_id: str
+    id: UUID
+    user_id: UUID
     created_at: datetime
     updated_at: datetime
     synced_at: Optional[datetime] = None
@@ -45,10 +46,10 @@ class NoteResponse(NoteBase):
 
 class NoteSyncItem(BaseModel):
     """Note data for sync operations."""
-    id: str
+    id: UUID
     title: str = ""
     content: str = ""
-    folder_id: Optional[str] = None
+    folder_id: Optional[UUID] = None
     audio_path: Optional[str] = None
     date: datetime
     updated_at: datetime
@@ -73,3 +74,7 @@ class SyncResponse(BaseModel):
 from .folder import FolderSyncItem, FolderResponse
 SyncRequest.model_rebuild()
 SyncResponse.model_rebuild()
+
+# Built once; sync bodies are parsed straight from JSON bytes with these
+SYNC_REQUEST_ADAPTER = TypeAdapter(SyncRequest)
+SYNC_RESPONSE_ADAPTER = TypeAdapter(SyncResponse)
@@ -2,8 +2,10 @@
 Authentication service for user registration and login.
 """
 
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
 from ..models.user import User
@@ -14,7 +16,10 @@ from ..utils.security import (
     create_access_token,
     create_refresh_token,
     decode_token,
+    get_token_subject,
+    invalidate_cached_user,
 )
+from ..utils.user_loader import user_loader
 
 
 class AuthService:
@@ -25,28 +30,27 @@ class AuthService:
     
     async def register(self, user_data: UserRegister) -> UserResponse:
         """Register a new user."""
-        # Check if email already exists
-        result = await self.db.execute(
-            select(User).where(User.email == user_data.email)
-        )
-        existing_user = result.scalar_one_or_none()
+        # Hash off the event loop so concurrent requests keep being served
+        password_hash = await asyncio.to_thread(get_password_hash, user_data.password)
         
-        if existing_user:
+        # Insert directly and let the unique index on email reject duplicates,
+        # instead of checking first; RETURNING saves the refresh round-trip.
+        try:
+            result = await self.db.execute(
+                insert(User).values(
+                    email=user_data.email,
+                    password_hash=password_hash
+                ).returning(User)
+            )
+            user = result.scalar_one()
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        # Create new user
-        user = User(
-            email=user_data.email,
-            password_hash=get_password_hash(user_data.password)
-        )
-        
-        self.db.add(user)
-        await self.db.commit()
-        await self.db.refresh(user)
-        
         return UserResponse.model_validate(user)
     
     async def login(self, login_data: UserLogin) -> Token:
@@ -57,15 +61,17 @@ class AuthService:
         )
         user = result.scalar_one_or_none()
         
-        if not user or not verify_password(login_data.password, user.password_hash):
+        if not user or not await asyncio.to_thread(
+            verify_password, login_data.password, user.password_hash
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
             )
         
         # Create tokens
-        access_token = create_access_token(data={"sub": user.id})
-        refresh_token = create_refresh_token(data={"sub": user.id})
+        access_token = create_access_token(data={"sub": str(user.id)})
+        refresh_token = create_refresh_token(data={"sub": str(user.id)})
         
         return Token(
             access_token=access_token,
@@ -82,13 +88,10 @@ class AuthService:
                 detail="Invalid refresh token"
             )
         
-        user_id = payload.get("sub")
+        user_id = get_token_subject(payload)
         
-        # Verify user still exists
-        result = await self.db.execute(
-            select(User).where(User.id == user_id)
-        )
-        user = result.scalar_one_or_none()
+        # Verify user still exists (batched with concurrent auth lookups)
+        user = await user_loader.load(user_id) if user_id is not None else None
         
         if not user:
             raise HTTPException(
@@ -96,9 +99,12 @@ class AuthService:
                 detail="User not found"
             )
         
+        # Tokens are being rotated, so forget users cached for the old ones
+        invalidate_cached_user(user.id)
+        
         # Create new tokens
-        access_token = create_access_token(data={"sub": user.id})
-        new_refresh_token = create_refresh_token(data={"sub": user.id})
+        access_token = create_access_token(data={"sub": str(user.id)})
+        new_refresh_token = create_refresh_token(data={"sub": str(user.id)})
         
         return Token(
             access_token=access_token,
@@ -0,0 +1,112 @@
+"""
+Persistent embedding cache for LlamaIndex, backed by SQLite.
+
+Plugged into an embedding model via its embeddings_cache field, so texts
+that were embedded before (e.g. when re-indexing all notes) are served
+from disk instead of calling the embedding API again.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Optional
+import numpy as np
+from llama_index.core.storage.kvstore.types import BaseKVStore, DEFAULT_COLLECTION
+
+
+def _decode(vector: bytes) -> List[float]:
+    """Widen a stored float16 vector to a list of floats."""
+    return np.frombuffer(vector, dtype=np.float16).astype(np.float32).tolist()
+
+
+class SQLiteEmbeddingCache(BaseKVStore):
+    """
+    Key-value store mapping text to its embedding vector.
+
+    Keys are SHA-256 digests of the text, scoped by namespace (the embedding
+    model name), so a model change never serves stale vectors. Vectors are
+    stored as packed float16 (as in Float16VectorStore), halving the file,
+    and widened to float32 on read.
+
+    LlamaIndex caches chat query embeddings here too, so the table is capped
+    at max_rows: each put evicts the entries written longest ago (re-embedded
+    texts count as new).
+    """
+
+    def __init__(self, path: str, namespace: str = "", max_rows: int = 50_000):
+        self.path = path
+        self.namespace = namespace
+        self.max_rows = max_rows
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            # Caches written before the float16 format held float32 blobs
+            conn.execute("DROP TABLE IF EXISTS embeddings")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings_f16 "
+                "(collection TEXT, key TEXT, vector BLOB, PRIMARY KEY (collection, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call, so the cache is safe to use from worker threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        """Store the (single) embedding in val under the text key."""
+        vector = np.asarray(next(iter(val.values())), dtype=np.float16).tobytes()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings_f16 VALUES (?, ?, ?)",
+                (collection, self._key(key), vector)
+            )
+            # Rowids grow with every write, so this is a cheap range delete
+            # that keeps at most max_rows entries
+            conn.execute(
+                "DELETE FROM embeddings_f16 WHERE rowid <= (SELECT max(rowid) FROM embeddings_f16) - ?",
+                (self.max_rows,)
+            )
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        await asyncio.to_thread(self.put, key, val, collection)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        """Get the cached embedding for a text, or None on a miss."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT vector FROM embeddings_f16 WHERE collection = ? AND key = ?",
+                (collection, self._key(key))
+            ).fetchone()
+        if row is None:
+            return None
+        return {"embedding": _decode(row[0])}
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        """Get all cached embeddings, keyed by text digest."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, vector FROM embeddings_f16 WHERE collection = ?",
+                (collection,)
+            ).fetchall()
+        return {key: {"embedding": _decode(vector)} for key, vector in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.get_all, collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        """Drop the cached embedding for a text."""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "DELETE FROM embeddings_f16 WHERE collection = ? AND key = ?",
+                (collection, self._key(key))
+            )
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return await asyncio.to_thread(self.delete, key, collection)
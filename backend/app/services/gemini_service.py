@@ -2,26 +2,192 @@
 Gemini AI service for audio transcription and text rewriting.
 """
 
+import asyncio
+import io
 import os
+from functools import lru_cache
+import aiofiles.os
 from pathlib import Path
-from typing import Optional
+from typing import IO, Optional, Union
 import google.generativeai as genai
 
 from ..config import get_settings
 
 settings = get_settings()
 
+GEMINI_MODEL = "gemini-3-flash-preview"
+
+# Inline media must keep the whole request under 20MB; base64 adds a third
+_INLINE_MEDIA_LIMIT = 14 * 1024 * 1024
+
+# Audio MIME types keyed by lowercase file extension
+AUDIO_MIME_TYPES = {
+    ".m4a": "audio/mp4",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".webm": "audio/webm",
+    ".ogg": "audio/ogg",
+}
+
+# (MIME substring, file suffix) pairs for writing audio bytes to disk for Whisper
+_AUDIO_SUFFIX_HINTS = (
+    ("wav", ".wav"),
+    ("m4a", ".m4a"),
+    ("mp4", ".m4a"),
+    ("ogg", ".ogg"),
+)
+
+TRANSCRIPTION_PROMPT = "Transcribe the following audio file verbatim. Do not add any conversational filler."
+
+OCR_INSTRUCTIONS = "Extract all text visible in the image you are given. Provide ONLY the extracted text, maintaining the original layout as much as possible."
+
+# Static instructions are sent as each model's system_instruction, so a request
+# only carries its own payload (text, image, coordinates).
+REWRITE_INSTRUCTIONS = """You are an expert archaeological documentation specialist. Rewrite the following text according to professional archaeological field documentation standards.
+
+Follow these guidelines:
+1. First, detect the language of the provided text.
+2. You must provide the entire response (the rewritten documentation and any headings) in the same language as the input text.
+3. Use formal, objective, and precise language
+4. Include proper stratigraphic terminology where applicable
+5. Use correct archaeological nomenclature for artifacts, features, and contexts
+6. Structure the text with clear sections if needed (e.g., Context, Description, Finds, Interpretation)
+7. Maintain scientific accuracy and avoid speculation
+8. Use passive voice where appropriate for objectivity
+9. Include measurement units in metric system
+10. Reference spatial relationships clearly (e.g., north, south, above, below)
+11. Preserve all factual information from the original text
+12. Format dates in archaeological standard format if mentioned"""
+
+IMAGE_INSTRUCTIONS = """Analyze the archaeological photo you are given and provide the following information in JSON format.
+This is what distinguishes science from treasure hunting.
+First, write information in russian. You must provide the entire response
+
+1. Spatial Context (Where?)
+- Stratigraphic Index (Layer/Unit): The number of the earth's layer (e.g., "US 105"). If unknown, state "unknown".
+- Square/Excavation Site: (E.g., "Sector B, Square 4").
+- Coordinates (X, Y): Estimate if possible from markers, otherwise "unknown".
+- Leveling (Z - Depth): Depth from the "zero point".
+- Position Status: "In situ", "In a redeposited layer", or "In a spoil heap".
+
+2. Physical Characteristics (What?)
+- Material: (Ceramics, Bone, Bronze, Iron, Glass, Stone, etc).
+- Object Type: (Vessel Wall Fragment, Rim, Handle, Arrowhead, Coin, etc).
+- Dimensions: Estimate Length, Width, Thickness, Diameter if markers are present.
+- Color: Describe appropriately (Munsell scale reference if possible).
+- Preservation: (Whole, Fragmented, Corroded, Fire Traces).
+
+3. Relational Context (What is it related to?)
+- Connection to structures: e.g., "Found inside Hearth #2".
+- Connection to other objects: e.g., "Found next to Skeleton #1".
+- Collection: Does this belong to a known collection/group?
+
+4. Administrative data (Who and When?)
+- Unique code (ID): Suggest a format like Year-Excavation-Sector-Number if visible, otherwise "unknown".
+- Finder: "unknown" (unless written).
+- Discovery date and time: "unknown" (unless written).
+
+Output ONLY valid JSON matching this structure:
+{
+    "spatial_context": {
+        "stratigraphic_index": "string",
+        "square_site": "string",
+        "coordinates": "string",
+        "leveling": "string",
+        "position_status": "string"
+    },
+    "physical_characteristics": {
+        "material": "string",
+        "object_type": "string",
+        "dimensions": "string",
+        "color": "string",
+        "preservation": "string"
+    },
+    "relational_context": {
+        "connection_structures": "string",
+        "connection_objects": "string",
+        "collection": "string"
+    },
+    "administrative_data": {
+        "unique_code": "string",
+        "finder": "string",
+        "discovery_date": "string"
+    }
+}"""
+
 
 class GeminiService:
     """Service for Gemini AI operations."""
     
     def __init__(self):
         """Initialize Gemini client."""
+        self._semaphore = asyncio.Semaphore(settings.max_concurrent_gemini)
+        
         if settings.gemini_api_key:
             genai.configure(api_key=settings.gemini_api_key)
-            self.model = genai.GenerativeModel('gemini-3-flash-preview')
+            self.model = genai.GenerativeModel(GEMINI_MODEL)
+            self.rewrite_model = genai.GenerativeModel(
+                GEMINI_MODEL, system_instruction=REWRITE_INSTRUCTIONS
+            )
+            self.image_model = genai.GenerativeModel(
+                GEMINI_MODEL, system_instruction=IMAGE_INSTRUCTIONS
+            )
+            self.ocr_model = genai.GenerativeModel(
+                GEMINI_MODEL, system_instruction=OCR_INSTRUCTIONS
+            )
         else:
             self.model = None
+            self.rewrite_model = None
+            self.image_model = None
+            self.ocr_model = None
+    
+    @staticmethod
+    def _generate_from_file(
+        model: genai.GenerativeModel,
+        prompt: Optional[str],
+        file: Union[str, IO[bytes]],
+        mime_type: str
+    ):
+        """
+        Run a model (and optional prompt) against a file via the Gemini File API.
+        
+        The file (a path or a binary file object) is streamed through a
+        resumable upload rather than inlined into the request, so large media
+        never has to be copied into the request body. The uploaded copy is
+        removed once the response has been generated. This blocks on network
+        I/O, so async callers run it in a worker thread.
+        """
+        uploaded = genai.upload_file(file, mime_type=mime_type)
+        try:
+            contents = [prompt, uploaded] if prompt else [uploaded]
+            return model.generate_content(contents)
+        finally:
+            try:
+                genai.delete_file(uploaded.name)
+            except Exception as e:
+                print(f"Gemini file cleanup error: {e}")
+    
+    async def _generate_from_bytes(
+        self,
+        model: genai.GenerativeModel,
+        prompt: Optional[str],
+        data: bytes,
+        mime_type: str
+    ):
+        """
+        Run a model (and optional prompt) against in-memory media.
+        
+        Small payloads are sent inline. Payloads over the inline request
+        limit go through the File API from a BytesIO view of the same buffer,
+        since the base64-encoded inline form would be rejected.
+        """
+        if len(data) > _INLINE_MEDIA_LIMIT:
+            return await asyncio.to_thread(
+                self._generate_from_file, model, prompt, io.BytesIO(data), mime_type
+            )
+        
+        media = {"mime_type": mime_type, "data": data}
+        return await model.generate_content_async([prompt, media] if prompt else media)
     
     async def transcribe_audio(self, audio_path: str) -> Optional[str]:
         """
@@ -33,47 +199,16 @@ class GeminiService:
         Returns:
             Transcribed text or None if error
         """
-        # Try Gemini first (online)
-        if self.model:
-            try:
-                # Check if file exists
-                if not os.path.exists(audio_path):
-                    raise FileNotFoundError(f"Audio file not found: {audio_path}")
-                
-                # Read audio file
-                with open(audio_path, "rb") as f:
-                    audio_bytes = f.read()
-                
-                # Determine MIME type based on extension
-                extension = Path(audio_path).suffix.lower()
-                mime_types = {
-                    ".m4a": "audio/mp4",
-                    ".mp3": "audio/mpeg",
-                    ".wav": "audio/wav",
-                    ".webm": "audio/webm",
-                    ".ogg": "audio/ogg",
-                }
-                mime_type = mime_types.get(extension, "audio/mpeg")
-                
-                # Create content for Gemini
-                response = self.model.generate_content([
-                    "Transcribe the following audio file verbatim. Do not add any conversational filler.",
-                    {
-                        "mime_type": mime_type,
-                        "data": audio_bytes
-                    }
-                ])
-                
-                return response.text
-                
-            except Exception as e:
-                print(f"Gemini transcription error: {e}. Switching to offline Whisper transcription.")
-        else:
-            print("Gemini API key not configured. Using offline Whisper transcription.")
-
-        # Fallback to Whisper (offline)
-        from .whisper_service import WhisperService
-        return WhisperService.transcribe(audio_path)
+        # Check if file exists
+        if not os.path.exists(audio_path):
+            print(f"Audio file not found: {audio_path}")
+            return None
+        
+        # Determine MIME type based on extension
+        mime_type = AUDIO_MIME_TYPES.get(Path(audio_path).suffix.lower(), "audio/mpeg")
+        
+        # Upload straight from disk instead of reading the file into memory
+        return await self.transcribe_audio_file(audio_path, mime_type)
     
     async def transcribe_audio_bytes(
         self,
@@ -93,13 +228,10 @@ class GeminiService:
         # Try Gemini first (online)
         if self.model:
             try:
-                response = self.model.generate_content([
-                    "Transcribe the following audio file verbatim. Do not add any conversational filler.",
-                    {
-                        "mime_type": mime_type,
-                        "data": audio_bytes
-                    }
-                ])
+                async with self._semaphore:
+                    response = await self._generate_from_bytes(
+                        self.model, TRANSCRIPTION_PROMPT, audio_bytes, mime_type
+                    )
                 
                 return response.text
                 
@@ -113,20 +245,55 @@ class GeminiService:
         import tempfile
         from .whisper_service import WhisperService
         
-        suffix = ".mp3" # Default or derive from mime_type if critical
-        if "wav" in mime_type: suffix = ".wav"
-        elif "m4a" in mime_type or "mp4" in mime_type: suffix = ".m4a"
-        elif "ogg" in mime_type: suffix = ".ogg"
+        suffix = next(
+            (ext for hint, ext in _AUDIO_SUFFIX_HINTS if hint in mime_type),
+            ".mp3"
+        )
 
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
             temp_file.write(audio_bytes)
             temp_path = temp_file.name
         
         try:
-            return WhisperService.transcribe(temp_path)
+            return await WhisperService.atranscribe(temp_path)
         finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            try:
+                await aiofiles.os.remove(temp_path)
+            except OSError:
+                pass
+    
+    async def transcribe_audio_file(
+        self,
+        audio_path: str,
+        mime_type: str = "audio/mp4"
+    ) -> Optional[str]:
+        """
+        Transcribe an audio file on disk without reading it into memory.
+        
+        Args:
+            audio_path: Path to the audio file
+            mime_type: MIME type of the audio
+            
+        Returns:
+            Transcribed text or None if error
+        """
+        # Try Gemini first (online)
+        if self.model:
+            try:
+                async with self._semaphore:
+                    response = await asyncio.to_thread(
+                        self._generate_from_file, self.model, TRANSCRIPTION_PROMPT, audio_path, mime_type
+                    )
+                return response.text
+                
+            except Exception as e:
+                print(f"Gemini transcription error: {e}. Switching to offline Whisper transcription.")
+        else:
+            print("Gemini API key not configured. Using offline Whisper transcription.")
+
+        # Fallback to Whisper (offline), which reads the same file directly
+        from .whisper_service import WhisperService
+        return await WhisperService.atranscribe(audio_path)
     
     async def rewrite_for_archaeology(self, text: str) -> Optional[str]:
         """
@@ -145,34 +312,36 @@ class GeminiService:
             return None
         
         try:
-            prompt = """You are an expert archaeological documentation specialist. Rewrite the following text according to professional archaeological field documentation standards.
-
-Follow these guidelines:
-1. First, detect the language of the provided {text}. 
-2. You must provide the entire response (the rewritten documentation and any headings) in the same language as the input text.
-3. Use formal, objective, and precise language
-4. Include proper stratigraphic terminology where applicable
-5. Use correct archaeological nomenclature for artifacts, features, and contexts
-6. Structure the text with clear sections if needed (e.g., Context, Description, Finds, Interpretation)
-7. Maintain scientific accuracy and avoid speculation
-8. Use passive voice where appropriate for objectivity
-9. Include measurement units in metric system
-10. Reference spatial relationships clearly (e.g., north, south, above, below)
-11. Preserve all factual information from the original text
-12. Format dates in archaeological standard format if mentioned
-
-Original text:
-{text}
-
-Please provide the rewritten documentation:"""
-            
-            response = self.model.generate_content(prompt.format(text=text))
+            async with self._semaphore:
+                response = await self.rewrite_model.generate_content_async(
+                    f"Original text:\n{text}\n\nPlease provide the rewritten documentation:"
+                )
             return response.text
             
         except Exception as e:
             print(f"Gemini rewrite error: {e}")
             return None
 
+    @staticmethod
+    def _image_analysis_prompt(
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> str:
+        """Build the per-request part of the image analysis prompt."""
+        prompt = "Analyze this archaeological photo."
+        if latitude is not None and longitude is not None:
+            prompt += f" Note: The photo was taken at coordinates: Latitude {latitude}, Longitude {longitude}. Use this to infer location context if possible."
+        return prompt
+
+    @staticmethod
+    def _strip_json_fences(text: str) -> str:
+        """Extract JSON from a response if it's wrapped in code blocks."""
+        if "```json" in text:
+            text = text.split("```json")[1].split("```")[0].strip()
+        elif "```" in text:
+            text = text.split("```")[1].split("```")[0].strip()
+        return text
+
     async def analyze_image_bytes(
         self,
         image_bytes: bytes,
@@ -196,84 +365,14 @@ Please provide the rewritten documentation:"""
             raise ValueError("Gemini API key not configured")
         
         try:
-            location_info = ""
-            if latitude is not None and longitude is not None:
-                location_info = f"\n            Note: The photo was taken at coordinates: Latitude {latitude}, Longitude {longitude}. Use this to infer location context if possible."
-
-            prompt = f"""
-            Analyze this archaeological photo and provide the following information in JSON format.
-            This is what distinguishes science from treasure hunting.{location_info}.
-            First, write information in russian. You must provide the entire response
-            
-            1. Spatial Context (Where?)
-            - Stratigraphic Index (Layer/Unit): The number of the earth's layer (e.g., "US 105"). If unknown, state "unknown".
-            - Square/Excavation Site: (E.g., "Sector B, Square 4").
-            - Coordinates (X, Y): Estimate if possible from markers, otherwise "unknown".
-            - Leveling (Z - Depth): Depth from the "zero point".
-            - Position Status: "In situ", "In a redeposited layer", or "In a spoil heap".
-            
-            2. Physical Characteristics (What?)
-            - Material: (Ceramics, Bone, Bronze, Iron, Glass, Stone, etc).
-            - Object Type: (Vessel Wall Fragment, Rim, Handle, Arrowhead, Coin, etc).
-            - Dimensions: Estimate Length, Width, Thickness, Diameter if markers are present.
-            - Color: Describe appropriately (Munsell scale reference if possible).
-            - Preservation: (Whole, Fragmented, Corroded, Fire Traces).
-            
-            3. Relational Context (What is it related to?)
-            - Connection to structures: e.g., "Found inside Hearth #2".
-            - Connection to other objects: e.g., "Found next to Skeleton #1".
-            - Collection: Does this belong to a known collection/group?
+            prompt = self._image_analysis_prompt(latitude, longitude)
             
-            4. Administrative data (Who and When?)
-            - Unique code (ID): Suggest a format like Year-Excavation-Sector-Number if visible, otherwise "unknown".
-            - Finder: "unknown" (unless written).
-            - Discovery date and time: "unknown" (unless written).
+            async with self._semaphore:
+                response = await self._generate_from_bytes(
+                    self.image_model, prompt, image_bytes, mime_type
+                )
             
-            Output ONLY valid JSON matching this structure:
-            {{
-                "spatial_context": {{
-                    "stratigraphic_index": "string",
-                    "square_site": "string",
-                    "coordinates": "string",
-                    "leveling": "string",
-                    "position_status": "string"
-                }},
-                "physical_characteristics": {{
-                    "material": "string",
-                    "object_type": "string",
-                    "dimensions": "string",
-                    "color": "string",
-                    "preservation": "string"
-                }},
-                "relational_context": {{
-                    "connection_structures": "string",
-                    "connection_objects": "string",
-                    "collection": "string"
-                }},
-                "administrative_data": {{
-                    "unique_code": "string",
-                    "finder": "string",
-                    "discovery_date": "string"
-                }}
-            }}
-            """
-            
-            response = self.model.generate_content([
-                prompt,
-                {
-                    "mime_type": mime_type,
-                    "data": image_bytes
-                }
-            ])
-            
-            # Extract JSON from response if it's wrapped in code blocks
-            text = response.text
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-                
-            return text
+            return self._strip_json_fences(response.text)
             
         except Exception as e:
             print(f"Gemini image analysis error: {e}")
@@ -298,15 +397,10 @@ Please provide the rewritten documentation:"""
             raise ValueError("Gemini API key not configured")
             
         try:
-            prompt = "Extract all text visible in this image. Provide ONLY the extracted text, maintaining the original layout as much as possible."
-            
-            response = self.model.generate_content([
-                prompt,
-                {
-                    "mime_type": mime_type,
-                    "data": image_bytes
-                }
-            ])
+            async with self._semaphore:
+                response = await self._generate_from_bytes(
+                    self.ocr_model, None, image_bytes, mime_type
+                )
             
             return response.text
             
@@ -314,14 +408,71 @@ Please provide the rewritten documentation:"""
             print(f"Gemini OCR error: {e}")
             return None
 
+    async def analyze_image_file(
+        self,
+        image_path: str,
+        mime_type: str = "image/jpeg",
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Analyze an image file on disk without reading it into memory.
+        
+        Args:
+            image_path: Path to the image file
+            mime_type: MIME type of the image
+            latitude: Optional latitude where photo was taken
+            longitude: Optional longitude where photo was taken
+            
+        Returns:
+            JSON string containing the analysis
+        """
+        if not self.model:
+            raise ValueError("Gemini API key not configured")
+        
+        try:
+            prompt = self._image_analysis_prompt(latitude, longitude)
+            async with self._semaphore:
+                response = await asyncio.to_thread(
+                    self._generate_from_file, self.image_model, prompt, image_path, mime_type
+                )
+            return self._strip_json_fences(response.text)
+            
+        except Exception as e:
+            print(f"Gemini image analysis error: {e}")
+            return None
 
-# Singleton instance
-_gemini_service: Optional[GeminiService] = None
+    async def extract_text_from_image_file(
+        self,
+        image_path: str,
+        mime_type: str = "image/jpeg"
+    ) -> Optional[str]:
+        """
+        Extract text (OCR) from an image file on disk without reading it into memory.
+        
+        Args:
+            image_path: Path to the image file
+            mime_type: MIME type of the image
+            
+        Returns:
+            Extracted text or None if error
+        """
+        if not self.model:
+            raise ValueError("Gemini API key not configured")
+            
+        try:
+            async with self._semaphore:
+                response = await asyncio.to_thread(
+                    self._generate_from_file, self.ocr_model, None, image_path, mime_type
+                )
+            return response.text
+            
+        except Exception as e:
+            print(f"Gemini OCR error: {e}")
+            return None
 
 
+@lru_cache()
 def get_gemini_service() -> GeminiService:
-    """Get or create GeminiService instance."""
-    global _gemini_service
-    if _gemini_service is None:
-        _gemini_service = GeminiService()
-    return _gemini_service
+    """Get cached GeminiService instance."""
+    return GeminiService()
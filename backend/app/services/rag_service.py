@@ -1,19 +1,56 @@
 """
 RAG Service using LlamaIndex and PostgreSQL (pgvector).
+
+With a PostgreSQL DATABASE_URL, chunks live in the pgvector table
+data_diary_embeddings. Otherwise (e.g. SQLite in development) the index
+falls back to a file-based store under ./storage, with float16 embeddings.
 """
 
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional
+import os
+import random
+import shutil
+import tempfile
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple, TypedDict
 from llama_index.core import (
     VectorStoreIndex,
     StorageContext,
     Document,
     Settings as LlamaSettings,
 )
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.utils import get_tokenizer
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    InternalServerError,
+    ResourceExhausted,
+    ServiceUnavailable,
+)
 from llama_index.vector_stores.postgres import PGVectorStore
 from llama_index.llms.gemini import Gemini
 from llama_index.embeddings.gemini import GeminiEmbedding
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
 from ..config import get_settings
+from ..database import engine
+from .embedding_cache import SQLiteEmbeddingCache
+from .vector_store import Float16VectorStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock on the storage directory
+    fcntl = None
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -29,10 +66,15 @@ if settings.gemini_api_key:
             api_key=settings.gemini_api_key,
             model_name="models/gemini-3-flash-preview"
         )
-        # Embedding
+        # Embedding, with previously embedded texts served from disk
         LlamaSettings.embed_model = GeminiEmbedding(
             api_key=settings.gemini_api_key,
-            model_name="models/gemini-embedding-001"
+            model_name="models/gemini-embedding-001",
+            embeddings_cache=SQLiteEmbeddingCache(
+                "./storage/embed_cache.sqlite3",
+                namespace="models/gemini-embedding-001",
+                max_rows=settings.embed_cache_max_rows
+            )
         )
         logger.info("LlamaIndex Settings initialized successfully.")
     except Exception as e:
@@ -44,19 +86,231 @@ else:
     raise ValueError("GEMINI_API_KEY is not set. Please set it in your .env file.")
 
 
+# Rate limiting (429) and transient server errors are retried with backoff
+_RETRYABLE_EMBED_ERRORS = (
+    ResourceExhausted,
+    ServiceUnavailable,
+    InternalServerError,
+    DeadlineExceeded,
+)
+_EMBED_MAX_ATTEMPTS = 5
+
+# User-scoped retrievers kept for chat (least recently used are dropped)
+_MAX_CACHED_RETRIEVERS = 128
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful and empathetic AI assistant for an archaeology field diary app called ArchSet. "
+    "You have access to the user's personal diary entries. "
+    "Answer questions based ONLY on the provided context from their diary. "
+    "If the answer is not in the diary, say you don't know based on the diary. "
+    "Be professional but friendly."
+)
+
+
+class DiaryEntry(TypedDict):
+    """A note to index, as passed to RAGService.sync_diary_batch."""
+    note_id: str
+    text: str
+    user_id: str
+    title: str
+
+
 class RAGService:
     def __init__(self):
         self.storage_path = "./storage" # Local directory for vector store
         self.embed_dim = 3072
+        # Keeps each chunk well inside the embedding model's input limit
+        self._splitter = SentenceSplitter(
+            chunk_size=settings.embed_chunk_size,
+            chunk_overlap=settings.embed_chunk_overlap
+        )
+        self.vector_store: Optional[PGVectorStore] = None
+        if settings.database_url.startswith("postgresql"):
+            self.vector_store = self._create_pg_vector_store()
+        self._index: Optional[VectorStoreIndex] = None
+        self._index_mtime: Optional[int] = None
+        # In-memory changes not yet persisted (sync_diary_batch(persist=False))
+        self._dirty = False
+        self._retrievers: "OrderedDict[str, BaseRetriever]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._index_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._embed_semaphore: Optional[asyncio.Semaphore] = None
+
+    def _create_pg_vector_store(self) -> PGVectorStore:
+        """
+        Create the pgvector store on the application database.
+        
+        pgvector can only index up to 2000 dimensions of a plain vector, so
+        embeddings are stored as halfvec to get an HNSW index. The table and
+        index are created by initialize() at startup.
+        """
+        url = make_url(settings.database_url)
+        # str(URL) masks the password as ***, so render the URLs explicitly
+        sync_url = url.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False)
+        async_url = url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+        return PGVectorStore.from_params(
+            connection_string=sync_url,
+            async_connection_string=async_url,
+            table_name="diary_embeddings",
+            embed_dim=self.embed_dim,
+            use_halfvec=True,
+            hnsw_kwargs={
+                "hnsw_m": 16,
+                "hnsw_ef_construction": 64,
+                "hnsw_ef_search": 40,
+                "hnsw_dist_method": "halfvec_cosine_ops",
+            },
+        )
+
+    def _bind_loop(self) -> None:
+        """
+        Create the asyncio primitives for the running event loop.
+        
+        The Celery worker runs every job in a fresh event loop, so they are
+        recreated whenever the running loop changes.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._embed_semaphore = asyncio.Semaphore(settings.embed_concurrency)
+            self._index_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+
+    def _storage_mtime(self) -> Optional[int]:
+        """Modification time of the persisted vector store, written last by persist()."""
+        import os
+        try:
+            return os.stat(f"{self.storage_path}/default__vector_store.json").st_mtime_ns
+        except OSError:
+            return None
+
+    async def _get_index(self) -> VectorStoreIndex:
+        """
+        Get the index, loading it only on first use.
+        
+        With the file-based store the index is reloaded when another process
+        (e.g. the Celery worker) has persisted a newer version.
+        """
+        self._bind_loop()
+        async with self._index_lock:
+            if self.vector_store is None:
+                mtime = self._storage_mtime()
+                stale = self._index is None or mtime != self._index_mtime
+                if stale and self._dirty:
+                    # Reloading would drop our unsaved changes; persist() wins
+                    logger.warning("Vector store changed on disk while unsaved changes are pending.")
+                elif stale:
+                    self._index, self._index_mtime = await asyncio.to_thread(self._load_consistent_index)
+                    # Cached retrievers point at the replaced index
+                    self._retrievers.clear()
+            elif self._index is None:
+                self._index = self._load_index()
+            return self._index
+
+    def _get_retriever(self, index: VectorStoreIndex, user_id: str) -> BaseRetriever:
+        """
+        Get a retriever restricted to the user's entries, cached per user.
+        
+        A retriever snapshots the index's node IDs when it is built, so the
+        cached one is dropped whenever the user's entries are re-indexed.
+        """
+        retriever = self._retrievers.get(user_id)
+        if retriever is None:
+            retriever = index.as_retriever(filters=MetadataFilters(filters=[
+                MetadataFilter(key="user_id", value=user_id),
+            ]))
+            self._retrievers[user_id] = retriever
+            if len(self._retrievers) > _MAX_CACHED_RETRIEVERS:
+                self._retrievers.popitem(last=False)
+        else:
+            self._retrievers.move_to_end(user_id)
+        return retriever
+
+    def _load_consistent_index(self) -> Tuple[VectorStoreIndex, Optional[int]]:
+        """
+        Load the file-based index, retrying if files were replaced meanwhile.
+        
+        Readers take no lock, so a load that overlaps another process's
+        persist could mix old and new files; the vector store's mtime
+        changing during the load gives it away.
+        """
+        for _ in range(3):
+            before = self._storage_mtime()
+            index = self._load_index()
+            if self._storage_mtime() == before:
+                break
+        return index, before
+
+    @asynccontextmanager
+    async def _storage_write_lock(self):
+        """
+        Serialize writers of the file-based store.
+        
+        The asyncio lock orders batches within this process; the flock on
+        storage/.lock orders them against other API workers and the Celery
+        worker, so no process persists over changes it has not loaded.
+        """
+        async with self._write_lock:
+            os.makedirs(self.storage_path, exist_ok=True)
+            with open(os.path.join(self.storage_path, ".lock"), "a") as lock_file:
+                if fcntl is not None:
+                    await asyncio.to_thread(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    async def persist(self) -> None:
+        """Write the file-based index to disk; a no-op with pgvector."""
+        if self.vector_store is not None or self._index is None:
+            return
+        self._bind_loop()
+        async with self._storage_write_lock():
+            await self._persist_index(self._index)
 
-    def _get_index(self) -> VectorStoreIndex:
+    async def _persist_index(self, index: VectorStoreIndex) -> None:
+        """Write the file-based index to disk, off the event loop."""
+        await asyncio.to_thread(self._persist_atomically, index)
+        self._dirty = False
+        # Our own write must not trigger a reload
+        self._index_mtime = self._storage_mtime()
+
+    def _persist_atomically(self, index: VectorStoreIndex) -> None:
+        """
+        Persist into a scratch directory, then move each file into place.
+        
+        os.replace is atomic, so a crash mid-write never leaves a torn JSON
+        file. The vector store goes last, since its mtime marks a new version.
+        """
+        scratch = tempfile.mkdtemp(prefix=".persist-", dir=self.storage_path)
+        try:
+            index.storage_context.persist(persist_dir=scratch)
+            names = sorted(os.listdir(scratch), key=lambda name: name == "default__vector_store.json")
+            for name in names:
+                os.replace(os.path.join(scratch, name), os.path.join(self.storage_path, name))
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _load_index(self) -> VectorStoreIndex:
         """Load index from storage or create a new one."""
         import os
         from llama_index.core import load_index_from_storage
         
+        if self.vector_store is not None:
+            # Nothing to load: the table is queried and updated in place
+            return VectorStoreIndex.from_vector_store(
+                self.vector_store,
+                embed_model=LlamaSettings.embed_model
+            )
+        
         if os.path.exists(self.storage_path) and os.path.exists(f"{self.storage_path}/docstore.json"):
             try:
-                storage_context = StorageContext.from_defaults(persist_dir=self.storage_path)
+                storage_context = StorageContext.from_defaults(
+                    persist_dir=self.storage_path,
+                    vector_store=Float16VectorStore.from_persist_dir(self.storage_path)
+                )
                 return load_index_from_storage(storage_context, embed_model=LlamaSettings.embed_model)
             except Exception as e:
                 logger.error(f"Failed to load index from storage: {e}. Creating new one.")
@@ -68,12 +322,31 @@ class RAGService:
         """Create a fresh index."""
         return VectorStoreIndex.from_documents(
             [], 
+            storage_context=StorageContext.from_defaults(vector_store=Float16VectorStore()),
             embed_model=LlamaSettings.embed_model
         )
 
     async def initialize(self):
-        """Initialize the vector store (ensure storage directory exists)."""
+        """
+        Initialize the vector store and load the index.
+        
+        Runs at application startup, so the first chat request does not pay
+        for creating the pgvector extension, table and HNSW index (or for
+        loading the file-based store).
+        """
         import os
+        if self.vector_store is not None:
+            logger.info("Initializing RAG Service (pgvector table data_diary_embeddings)...")
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                # Creates the table and HNSW index if they are missing
+                await asyncio.to_thread(self.vector_store._initialize)
+                await self._get_index()
+            except Exception as e:
+                logger.error(f"Failed to initialize RAG Service: {e}")
+            return
+        
         try:
             logger.info("Initializing RAG Service (File-based)...")
             if not os.path.exists(self.storage_path):
@@ -86,97 +359,269 @@ class RAGService:
                 logger.info("Initialized empty vector store.")
             else:
                 logger.info("Existing storage found.")
+            
+            await self._get_index()
                 
         except Exception as e:
             logger.error(f"Failed to initialize RAG Service: {e}")
 
+    @staticmethod
+    def _split_into_chunks(text: str) -> List[str]:
+        """Split note text into paragraph chunks, dropping blank ones."""
+        return [chunk.strip() for chunk in text.split("\n\n") if chunk.strip()]
+
+    @staticmethod
+    def _chunk_id(note_id: str, title: str, chunk: str) -> str:
+        """Stable document ID for a chunk; changes whenever its embedded text does."""
+        digest = hashlib.blake2b(f"{title}\0{chunk}".encode("utf-8"), digest_size=8).hexdigest()
+        return f"{note_id}:{digest}"
+
+    async def _embed_batch(self, texts: List[str], delay: float) -> List[List[float]]:
+        """Embed one request's worth of texts, retrying rate limits and transient errors."""
+        if delay:
+            await asyncio.sleep(delay)
+        
+        self._bind_loop()
+        async with self._embed_semaphore:
+            for attempt in range(_EMBED_MAX_ATTEMPTS):
+                try:
+                    return await LlamaSettings.embed_model.aget_text_embedding_batch(texts)
+                except _RETRYABLE_EMBED_ERRORS as e:
+                    if attempt == _EMBED_MAX_ATTEMPTS - 1:
+                        raise
+                    backoff = min(30, 2 ** attempt) + random.random()
+                    logger.warning(f"Embedding request failed ({e}); retrying in {backoff:.1f}s")
+                    await asyncio.sleep(backoff)
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts as concurrent batched requests.
+        
+        At most EMBED_CONCURRENCY requests are in flight, and request starts
+        are spaced EMBED_MIN_INTERVAL_MS apart.
+        """
+        size = LlamaSettings.embed_model.embed_batch_size
+        interval = settings.embed_min_interval_ms / 1000
+        results = await asyncio.gather(*(
+            self._embed_batch(texts[start:start + size], delay=i * interval)
+            for i, start in enumerate(range(0, len(texts), size))
+        ))
+        return [embedding for batch in results for embedding in batch]
+
+    def _existing_chunk_ids(self, index: VectorStoreIndex, note_ids: List[str]) -> Dict[str, Set[str]]:
+        """Map each note to the IDs of its chunk documents currently in the index."""
+        existing: Dict[str, Set[str]] = defaultdict(set)
+        
+        if self.vector_store is not None:
+            nodes = self.vector_store.get_nodes(filters=MetadataFilters(filters=[
+                MetadataFilter(key="note_id", value=note_ids, operator=FilterOperator.IN),
+            ]))
+            for node in nodes:
+                existing[node.metadata.get("note_id")].add(node.ref_doc_id)
+        else:
+            for doc_id, info in index.ref_doc_info.items():
+                existing[info.metadata.get("note_id")].add(doc_id)
+        
+        return existing
+
+    def _apply_changes(
+        self,
+        index: VectorStoreIndex,
+        stale: List[str],
+        documents: List[Document],
+        nodes: List[BaseNode]
+    ) -> None:
+        """Remove stale chunk documents and add the new, already embedded nodes."""
+        for doc_id in stale:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        
+        if documents:
+            # Nodes that already carry an embedding are not embedded again
+            index.insert_nodes(nodes)
+            if self.vector_store is None:
+                for document in documents:
+                    index.docstore.set_document_hash(document.id_, document.hash)
+
     async def sync_diary_to_vector_db(self, note_id: str, text: str, user_id: str, title: str = ""):
+        """Ingest a single diary entry into the vector store."""
+        await self.sync_diary_batch([
+            DiaryEntry(note_id=note_id, text=text, user_id=user_id, title=title)
+        ])
+
+    async def sync_diary_batch(self, entries: List[DiaryEntry], persist: bool = True):
         """
-        Ingest a diary entry into the vector store.
+        Ingest several diary entries into the vector store at once.
+        
+        Each note is stored as one document per paragraph, identified by a hash
+        of its text. Only paragraphs that are new or changed since the last
+        sync are embedded; stale ones (including documents from older syncs
+        of the note) are removed. Paragraphs longer than EMBED_CHUNK_SIZE
+        tokens are split further; every chunk carries the note_id.
+        
+        All new chunks are embedded together with batched, concurrent
+        embedding requests, before the store is locked; only applying the
+        changes and persisting runs under the write lock, against a fresh
+        diff. Bulk callers can pass persist=False and call persist() once
+        at the end.
         """
+        self._bind_loop()
+        file_store = self.vector_store is None
         try:
-            # Load existing index
-            index = self._get_index()
-            
-            # Create a document
-            doc = Document(
-                text=text,
-                metadata={
-                    "note_id": note_id,
-                    "user_id": user_id,
-                    "title": title
-                },
-                excluded_llm_metadata_keys=["note_id", "user_id"],
-                excluded_embed_metadata_keys=["note_id", "user_id"]
-            )
+            # Only the last entry for a note counts
+            latest = {entry["note_id"]: entry for entry in entries}
+            wanted: Dict[str, Dict[str, str]] = {
+                note_id: {
+                    self._chunk_id(note_id, entry["title"], chunk): chunk
+                    for chunk in self._split_into_chunks(entry["text"])
+                }
+                for note_id, entry in latest.items()
+            }
             
-            # Insert document
-            # Note: SimpleVectorStore just appends. Duplicates might happen if we don't handle them.
-            # Ideally we check if doc exists effectively. 
-            # For this simple version, we just insert. 
-            # (Refinement: Delete old doc with same note_id if possible, but SimpleVectorStore is basic)
-            
-            index.insert(doc)
+            # Diff against the index as it is now. Only the in-process lock is
+            # taken, so reads never overlap a write from another batch's thread.
+            async with self._write_lock if file_store else nullcontext():
+                index = await self._get_index()
+                existing = await asyncio.to_thread(self._existing_chunk_ids, index, list(latest))
+            documents: List[Document] = [
+                Document(
+                    id_=doc_id,
+                    text=chunk,
+                    metadata={
+                        "note_id": note_id,
+                        "user_id": latest[note_id]["user_id"],
+                        "title": latest[note_id]["title"]
+                    },
+                    excluded_llm_metadata_keys=["note_id", "user_id"],
+                    excluded_embed_metadata_keys=["note_id", "user_id"]
+                )
+                for note_id, chunks in wanted.items()
+                for doc_id, chunk in chunks.items()
+                if doc_id not in existing[note_id]
+            ]
+            if not documents and not any(existing[note_id] - wanted[note_id].keys() for note_id in latest):
+                logger.info(f"{len(entries)} note(s) unchanged in vector DB; nothing to embed.")
+                return
             
-            # Persist changes to disk
-            index.storage_context.persist(persist_dir=self.storage_path)
+            # Embed before touching the index, so a failed request leaves it as it was
+            nodes = run_transformations(documents, [self._splitter])
+            embeddings = await self._embed_texts(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+            )
+            for node, embedding in zip(nodes, embeddings):
+                node.embedding = embedding
             
-            logger.info(f"Successfully synced note {note_id} to vector DB.")
+            # The file-based store is shared, so batches write it one at a time
+            async with self._storage_write_lock() if file_store else nullcontext():
+                # Another writer may have changed these notes while we embedded
+                index = await self._get_index()
+                existing = await asyncio.to_thread(self._existing_chunk_ids, index, list(latest))
+                stale = [
+                    doc_id
+                    for note_id in latest
+                    for doc_id in existing[note_id] - wanted[note_id].keys()
+                ]
+                documents = [
+                    document for document in documents
+                    if document.id_ not in existing[document.metadata["note_id"]]
+                ]
+                new_ids = {document.id_ for document in documents}
+                nodes = [node for node in nodes if node.ref_doc_id in new_ids]
+                
+                if not stale and not documents:
+                    logger.info(f"{len(entries)} note(s) already up to date in vector DB.")
+                    return
+                
+                # Index writes are blocking (pgvector round-trips), so run them in a thread
+                await asyncio.to_thread(self._apply_changes, index, stale, documents, nodes)
+                
+                # Retrievers snapshot the index's node IDs, so rebuild them for these users
+                for entry in latest.values():
+                    self._retrievers.pop(entry["user_id"], None)
+                
+                # Persist changes to disk (pgvector writes are already durable)
+                if file_store and persist:
+                    await self._persist_index(index)
+                elif file_store:
+                    self._dirty = True
+                
+                logger.info(
+                    f"Successfully synced {len(entries)} note(s) to vector DB "
+                    f"({len(documents)} chunks embedded, {len(stale)} removed)."
+                )
             
         except Exception as e:
             logger.error(f"Error syncing diary to vector DB: {e}")
             raise
 
+    @staticmethod
+    def _recent_history(chat_history: List[dict], token_limit: int) -> List[ChatMessage]:
+        """
+        Convert the newest messages of a chat history that fit in token_limit.
+        
+        The history is walked backwards and conversion stops at the budget,
+        so the cost of a turn is bounded by the limit, not by the length of
+        the conversation.
+        """
+        tokenizer = get_tokenizer()
+        messages: List[ChatMessage] = []
+        tokens = 0
+        for msg in reversed(chat_history):
+            content = msg.get("content") or ""
+            tokens += len(tokenizer(content))
+            if tokens > token_limit:
+                break
+            role = MessageRole.USER if msg.get("role") == "user" else MessageRole.ASSISTANT
+            messages.append(ChatMessage(role=role, content=content))
+        messages.reverse()
+        return messages
+
     async def chat_with_diary(self, user_query: str, chat_history: List[dict], user_id: str) -> str:
         """
         Chat with the diary context.
         """
+        return "".join([
+            token async for token in self.achat_stream(user_query, chat_history, user_id)
+        ])
+
+    async def achat_stream(
+        self,
+        user_query: str,
+        chat_history: List[dict],
+        user_id: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        Chat with the diary context, yielding the answer as it is generated.
+        """
         try:
-            index = self._get_index()
-            
-            # Configure retriever with filters
-            from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
+            index = await self._get_index()
             
-            # SimpleVectorStore supports metadata filters in recent LlamaIndex versions
-            filters = MetadataFilters(
-                filters=[
-                    MetadataFilter(key="user_id", value=user_id),
-                ]
-            )
-
             # Check if index is empty
-            # If docstore is empty, we can't answer questions.
-            if not index.docstore.docs:
-                return "I don't have any diary entries indexed yet. Please write some notes first!"
+            # If docstore is empty, we can't answer questions. (pgvector keeps
+            # no local docstore; an empty table just yields no context.)
+            if self.vector_store is None and not index.docstore.docs:
+                yield "I don't have any diary entries indexed yet. Please write some notes first!"
+                return
             
-            chat_engine = index.as_chat_engine(
-                chat_mode="context",
-                filters=filters,
+            # Engines are cheap once the retriever exists, and a fresh one per
+            # call keeps conversation memory from leaking between requests
+            token_limit = settings.chat_history_token_limit
+            chat_engine = ContextChatEngine.from_defaults(
+                retriever=self._get_retriever(index, user_id),
                 llm=LlamaSettings.llm,
-                system_prompt=(
-                    "You are a helpful and empathetic AI assistant for an archaeology field diary app called ArchSet. "
-                    "You have access to the user's personal diary entries. "
-                    "Answer questions based ONLY on the provided context from their diary. "
-                    "If the answer is not in the diary, say you don't know based on the diary. "
-                    "Be professional but friendly."
-                )
+                memory=ChatMemoryBuffer.from_defaults(
+                    chat_history=self._recent_history(chat_history, token_limit),
+                    token_limit=token_limit
+                ),
+                system_prompt=CHAT_SYSTEM_PROMPT
             )
             
-            # Convert history
-            from llama_index.core.llms import ChatMessage, MessageRole
-            
-            llama_history = []
-            for msg in chat_history:
-                role = MessageRole.USER if msg.get("role") == "user" else MessageRole.ASSISTANT
-                llama_history.append(ChatMessage(role=role, content=msg.get("content", "")))
-            
-            response = chat_engine.chat(user_query, chat_history=llama_history)
-            
-            return str(response)
+            response = await chat_engine.astream_chat(user_query)
+            async for token in response.async_response_gen():
+                yield token
             
         except Exception as e:
             logger.error(f"Error chatting with diary: {e}", exc_info=True)
-            return f"I'm sorry, I encountered an error while accessing your diary: {str(e)}"
+            yield f"I'm sorry, I encountered an error while accessing your diary: {str(e)}"
 
 # Singleton instance
 rag_service = RAGService()
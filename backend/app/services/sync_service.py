@@ -3,23 +3,63 @@ Sync service for handling offline-first synchronization.
 """
 
 from datetime import datetime
-from typing import List, Optional
-import os 
+from typing import List, Optional, Tuple
+import aiofiles.os
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from pydantic import TypeAdapter
 
 from ..models.note import Note
 from ..models.folder import Folder
 from ..models.user import User
 from ..schemas.note import NoteSyncItem, NoteResponse
 from ..schemas.folder import FolderSyncItem, FolderResponse
+from .rag_service import DiaryEntry
 
+_NOTE_LIST_ADAPTER = TypeAdapter(List[NoteResponse])
+_FOLDER_LIST_ADAPTER = TypeAdapter(List[FolderResponse])
+
+# Rows per upsert statement; each note row binds 11 parameters, and asyncpg
+# (32767) and SQLite cap the parameters of a single statement
+_UPSERT_BATCH_SIZE = 500
+
+
+def _upsert(db: AsyncSession, model):
+    """Return the dialect's INSERT construct, which supports ON CONFLICT."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _batches(items, size: int = _UPSERT_BATCH_SIZE):
+    """Split a list into consecutive slices of at most size items."""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _latest_versions(items):
+    """
+    Drop all but the newest version of each item.
+    
+    Offline clients can queue several edits of one note; sending them all
+    would write the row repeatedly, and PostgreSQL rejects an upsert that
+    touches the same row twice.
+    """
+    latest = {}
+    for item in items:
+        current = latest.get(item.id)
+        if current is None or item.updated_at > current.updated_at:
+            latest[item.id] = item
+    return list(latest.values())
 
-from fastapi import BackgroundTasks
-from ..services.rag_service import rag_service
 
 class SyncService:
-    """Service for handling data synchronization."""
+    """
+    Service for handling data synchronization.
+    
+    Methods do not commit, so one sync request can apply notes and folders
+    in a single transaction; the caller commits.
+    """
     
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -28,9 +68,8 @@ class SyncService:
         self,
         user: User,
         client_notes: List[NoteSyncItem],
-        last_sync_at: Optional[datetime],
-        background_tasks: Optional[BackgroundTasks] = None
-    ) -> List[NoteResponse]:
+        last_sync_at: Optional[datetime]
+    ) -> Tuple[List[NoteResponse], List[DiaryEntry]]:
         """
         Synchronize notes between client and server.
         
@@ -40,81 +79,89 @@ class SyncService:
             user: Current user
             client_notes: Notes from the client
             last_sync_at: Last sync timestamp from client
-            background_tasks: Background tasks for indexing
             
         Returns:
-            List of notes that changed on server since last sync
+            List of notes that changed on server since last sync, and the
+            entries to index; enqueue them only once the sync is committed
         """
         sync_time = datetime.utcnow()
         notes_to_index = []
         
-        # Process client notes
-        for client_note in client_notes:
-            # Check if note exists
-            result = await self.db.execute(
-                select(Note).where(
-                    Note.id == client_note.id,
-                    Note.user_id == user.id
+        # Apply client notes with batched upserts; a row is only overwritten
+        # when it belongs to the user and the client version is newer, and
+        # RETURNING yields exactly the rows that were inserted or updated.
+        # Deleted notes the server has never seen are kept as tombstones.
+        client_notes = _latest_versions(client_notes)
+        if client_notes:
+            # Stored content hashes, so notes whose text did not change (folder
+            # moves, re-sent edits) are not re-embedded, and stored audio paths,
+            # so tombstones only ever remove files the server recorded
+            stored_sha = {}
+            stored_audio = {}
+            for batch in _batches(client_notes):
+                result = await self.db.execute(
+                    select(Note.id, Note.content_sha, Note.audio_path).where(
+                        Note.id.in_([client_note.id for client_note in batch]),
+                        Note.user_id == user.id
+                    )
                 )
-            )
-            existing_note = result.scalar_one_or_none()
+                for row in result:
+                    stored_sha[row.id] = row.content_sha
+                    stored_audio[row.id] = row.audio_path
+            new_sha = {
+                client_note.id: Note.content_digest(client_note.title, client_note.content)
+                for client_note in client_notes
+            }
             
-            if existing_note:
-                # Update if client version is newer
-                if client_note.updated_at > existing_note.updated_at:
-                    existing_note.title = client_note.title
-                    existing_note.content = client_note.content
-                    existing_note.folder_id = client_note.folder_id
-                    existing_note.audio_path = client_note.audio_path
-                    existing_note.date = client_note.date
-                    existing_note.is_deleted = client_note.is_deleted
-                    existing_note.updated_at = client_note.updated_at
-                    existing_note.synced_at = sync_time
-
-                    # If sync marks as deleted, remove media file
-                    if client_note.is_deleted:
-                        if existing_note.audio_path and os.path.exists(existing_note.audio_path):
-                            try:
-                                os.remove(existing_note.audio_path)
-                                existing_note.audio_path = None # Clear path after delete
-                            except OSError:
-                                pass
-                    else:
-                        # If updated and not deleted, check if content changed/exists for indexing
-                        if client_note.content or client_note.title:
-                            notes_to_index.append(existing_note)
-            else:
-                # Create new note
-                if not client_note.is_deleted:
-                    new_note = Note(
-                        id=client_note.id,
-                        user_id=user.id,
-                        title=client_note.title,
-                        content=client_note.content,
-                        folder_id=client_note.folder_id,
-                        audio_path=client_note.audio_path,
-                        date=client_note.date,
-                        is_deleted=client_note.is_deleted,
-                        updated_at=client_note.updated_at,
-                        synced_at=sync_time
-                    )
-                    self.db.add(new_note)
-                    if new_note.content or new_note.title:
-                        notes_to_index.append(new_note)
-        
-        await self.db.flush()
-        
-        # Trigger background indexing
-        if background_tasks and notes_to_index:
-            for note in notes_to_index:
-                if note.content: # double check content exists
-                    background_tasks.add_task(
-                        rag_service.sync_diary_to_vector_db,
-                        note_id=note.id,
-                        text=note.content,
-                        user_id=user.id,
-                        title=note.title or "Untitled"
-                    )
+            rows = [
+                {
+                    "id": client_note.id,
+                    "user_id": user.id,
+                    "title": client_note.title,
+                    "content": client_note.content,
+                    "folder_id": client_note.folder_id,
+                    "audio_path": None if client_note.is_deleted else client_note.audio_path,
+                    "date": client_note.date,
+                    "is_deleted": client_note.is_deleted,
+                    "content_sha": new_sha[client_note.id],
+                    "updated_at": client_note.updated_at,
+                    "synced_at": sync_time,
+                }
+                for client_note in client_notes
+            ]
+            applied_ids = set()
+            for batch in _batches(rows):
+                stmt = _upsert(self.db, Note).values(batch)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Note.id],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in rows[0]
+                        if column not in ("id", "user_id")
+                    },
+                    where=(Note.user_id == user.id)
+                    & (Note.updated_at < stmt.excluded.updated_at)
+                ).returning(Note.id)
+                
+                result = await self.db.execute(stmt)
+                applied_ids.update(result.scalars())
+            
+            for client_note in client_notes:
+                if client_note.id not in applied_ids:
+                    continue
+                
+                # If sync marks as deleted, remove the stored media file
+                if client_note.is_deleted:
+                    audio_path = stored_audio.get(client_note.id)
+                    if audio_path:
+                        try:
+                            await aiofiles.os.remove(audio_path)
+                        except OSError:
+                            pass
+                elif (client_note.content or client_note.title) and (
+                    stored_sha.get(client_note.id) != new_sha[client_note.id]
+                ):
+                    notes_to_index.append(client_note)
         
         # Get server notes that changed since last sync
         query = select(Note).where(Note.user_id == user.id)
@@ -131,9 +178,16 @@ class SyncService:
         result = await self.db.execute(query)
         server_notes = result.scalars().all()
         
-        await self.db.commit()
-        
-        return [NoteResponse.model_validate(note) for note in server_notes]
+        entries = [
+            DiaryEntry(
+                note_id=str(note.id),
+                text=note.content,
+                user_id=str(user.id),
+                title=note.title or "Untitled"
+            )
+            for note in notes_to_index
+        ]
+        return _NOTE_LIST_ADAPTER.validate_python(server_notes, from_attributes=True), entries
     
     async def sync_folders(
         self,
@@ -152,37 +206,33 @@ class SyncService:
         Returns:
             List of folders that changed on server since last sync
         """
-        sync_time = datetime.utcnow()
-        
-        # Process client folders
-        for client_folder in client_folders:
-            result = await self.db.execute(
-                select(Folder).where(
-                    Folder.id == client_folder.id,
-                    Folder.user_id == user.id
+        # Apply client folders with batched upserts, same rules as notes
+        client_folders = _latest_versions(client_folders)
+        if client_folders:
+            rows = [
+                {
+                    "id": client_folder.id,
+                    "user_id": user.id,
+                    "name": client_folder.name,
+                    "color": client_folder.color,
+                    "is_deleted": client_folder.is_deleted,
+                    "updated_at": client_folder.updated_at,
+                }
+                for client_folder in client_folders
+            ]
+            for batch in _batches(rows):
+                stmt = _upsert(self.db, Folder).values(batch)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Folder.id],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in rows[0]
+                        if column not in ("id", "user_id")
+                    },
+                    where=(Folder.user_id == user.id)
+                    & (Folder.updated_at < stmt.excluded.updated_at)
                 )
-            )
-            existing_folder = result.scalar_one_or_none()
-            
-            if existing_folder:
-                if client_folder.updated_at > existing_folder.updated_at:
-                    existing_folder.name = client_folder.name
-                    existing_folder.color = client_folder.color
-                    existing_folder.is_deleted = client_folder.is_deleted
-                    existing_folder.updated_at = client_folder.updated_at
-            else:
-                if not client_folder.is_deleted:
-                    new_folder = Folder(
-                        id=client_folder.id,
-                        user_id=user.id,
-                        name=client_folder.name,
-                        color=client_folder.color,
-                        is_deleted=client_folder.is_deleted,
-                        updated_at=client_folder.updated_at
-                    )
-                    self.db.add(new_folder)
-        
-        await self.db.flush()
+                await self.db.execute(stmt)
         
         # Get server folders that changed
         query = select(Folder).where(Folder.user_id == user.id)
@@ -193,6 +243,4 @@ class SyncService:
         result = await self.db.execute(query)
         server_folders = result.scalars().all()
         
-        await self.db.commit()
-        
-        return [FolderResponse.model_validate(folder) for folder in server_folders]
+        return _FOLDER_LIST_ADAPTER.validate_python(server_folders, from_attributes=True)
@@ -0,0 +1,101 @@
+"""
+File-based vector store with half-precision embeddings.
+
+A drop-in SimpleVectorStore for the development (non-PostgreSQL) setup.
+Embeddings are kept in memory and on disk as float16 instead of Python
+float lists / JSON numbers, which cuts their footprint by roughly 4x in
+memory and far more on disk, and makes loading a binary read instead of
+parsing millions of JSON floats.
+"""
+
+import json
+import os
+from typing import Any, List, Optional, Sequence
+import fsspec
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.simple import SimpleVectorStoreData
+
+
+def _embeddings_path(persist_path: str) -> str:
+    """Companion .npz file holding the embeddings of a vector store JSON file."""
+    return os.path.splitext(persist_path)[0] + ".npz"
+
+
+class Float16VectorStore(SimpleVectorStore):
+    """
+    SimpleVectorStore that stores embeddings as float16 arrays.
+
+    The JSON file keeps node metadata and references only; embeddings go to
+    a .npz file next to it. Stores persisted by SimpleVectorStore (with
+    embeddings inside the JSON) still load, and are converted on the next
+    persist. Similarity is computed after upcasting to float64, so only
+    the stored precision changes.
+    """
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes to the store, keeping their embeddings as float16."""
+        node_ids = super().add(nodes, **add_kwargs)
+        for node_id in node_ids:
+            self.data.embedding_dict[node_id] = np.asarray(
+                self.data.embedding_dict[node_id], dtype=np.float16
+            )
+        return node_ids
+
+    def get(self, text_id: str) -> List[float]:
+        """Get an embedding as a list of floats."""
+        return np.asarray(super().get(text_id), dtype=np.float32).tolist()
+
+    def persist(
+        self,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+    ) -> None:
+        """Write metadata as JSON and embeddings as a float16 .npz file."""
+        fs = fs or self._fs
+        dirpath = os.path.dirname(persist_path)
+        if not fs.exists(dirpath):
+            fs.makedirs(dirpath)
+
+        ids = list(self.data.embedding_dict)
+        embeddings = np.asarray(
+            [self.data.embedding_dict[node_id] for node_id in ids], dtype=np.float16
+        )
+        with fs.open(_embeddings_path(persist_path), "wb") as f:
+            np.savez(f, ids=np.asarray(ids, dtype=str), embeddings=embeddings)
+
+        data = {
+            "embedding_dict": {},
+            "text_id_to_ref_doc_id": self.data.text_id_to_ref_doc_id,
+            "metadata_dict": self.data.metadata_dict,
+        }
+        with fs.open(persist_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+    ) -> "Float16VectorStore":
+        """Load a store persisted by this class or by SimpleVectorStore."""
+        fs = fs or fsspec.filesystem("file")
+        if not fs.exists(persist_path):
+            raise ValueError(f"No existing {__name__} found at {persist_path}, skipping load.")
+
+        with fs.open(persist_path, "rb") as f:
+            data = SimpleVectorStoreData.from_dict(json.load(f))
+
+        # Legacy JSON embeddings first, so the .npz (if any) takes precedence
+        embedding_dict = {
+            node_id: np.asarray(embedding, dtype=np.float16)
+            for node_id, embedding in data.embedding_dict.items()
+        }
+        npz_path = _embeddings_path(persist_path)
+        if fs.exists(npz_path):
+            with fs.open(npz_path, "rb") as f:
+                arrays = np.load(f)
+                embedding_dict.update(zip(arrays["ids"].tolist(), arrays["embeddings"]))
+        data.embedding_dict = embedding_dict
+        return cls(data)
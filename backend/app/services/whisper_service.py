@@ -1,33 +1,54 @@
 
+import asyncio
 import os
-import whisper
+import threading
 import warnings
+import ctranslate2
+from faster_whisper import WhisperModel
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from typing import Optional
 
+from ..config import get_settings
+
+settings = get_settings()
+
 # Filter annoying whisper warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 
 class WhisperService:
-    """Service for offline speech-to-text using OpenAI Whisper."""
+    """Service for offline speech-to-text using Whisper (faster-whisper / CTranslate2)."""
     
     _model = None
+    # Serializes loading so a transcription during the startup preload waits
+    # for it instead of downloading the model a second time
+    _model_lock = threading.Lock()
+    # Decodes run one at a time on a dedicated thread, so concurrent requests
+    # queue up instead of competing for CPU cores / GPU memory
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
     
     @classmethod
     def get_model(cls):
         """Lazy load the Whisper model."""
         if cls._model is None:
-            print("Loading Whisper 'base' model for offline transcription...")
-            # 'base' is a good balance for offline mobile/desktop app
-            cls._model = whisper.load_model("base")
-            print("Whisper model loaded successfully.")
+            with cls._model_lock:
+                if cls._model is None:
+                    print("Loading Whisper 'base' model for offline transcription...")
+                    # 'base' is a good balance for offline mobile/desktop app.
+                    # Quantized int8 weights; activations in FP16 when on GPU.
+                    on_gpu = ctranslate2.get_cuda_device_count() > 0
+                    compute_type = settings.whisper_compute_type or (
+                        "int8_float16" if on_gpu else "int8"
+                    )
+                    cls._model = WhisperModel("base", device="auto", compute_type=compute_type)
+                    print("Whisper model loaded successfully.")
         return cls._model
 
     @classmethod
     def ensure_model_downloaded(cls):
         """
         Triggers the model download if not already present.
-        Call this during app startup depending on strategy.
+        The app runs this in a background task at startup.
         """
         try:
             print("Checking Whisper model availability...")
@@ -48,12 +69,23 @@ class WhisperService:
         """
         try:
             model = cls.get_model()
-            result = model.transcribe(audio_path)
-            return result["text"].strip()
+            # VAD skips silence; segments are decoded lazily while we join them
+            segments, _ = model.transcribe(
+                audio_path,
+                beam_size=settings.whisper_beam_size,
+                vad_filter=True
+            )
+            return " ".join(segment.text.strip() for segment in segments).strip()
         except Exception as e:
             print(f"Whisper transcription error: {e}")
             return None
 
+    @classmethod
+    async def atranscribe(cls, audio_path: str) -> Optional[str]:
+        """Transcribe on the Whisper thread, so the event loop keeps serving requests."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, cls.transcribe, audio_path)
+
 # Global instance pattern not strictly needed as using @classmethod, 
 # but consistent with other services if we want to instantiate.
 whisper_service = WhisperService()
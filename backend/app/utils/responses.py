@@ -0,0 +1,45 @@
+"""
+JSON response classes and helpers.
+"""
+
+from typing import Any, Type
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, used as the app-wide default."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(adapter: TypeAdapter, data: Any, status_code: int = 200) -> Response:
+    """
+    Validate ORM data against a cached TypeAdapter and serialize it in one pass.
+
+    Returning the Response directly skips FastAPI's second validation and
+    encoding pass over the response_model.
+    """
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(data, from_attributes=True)),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def trusted_json_response(model: Type[BaseModel], obj: Any, status_code: int = 200) -> Response:
+    """
+    Serialize a row we just read from or wrote to the database, without validating it.
+    
+    The fields are copied into the model with model_construct, so use this only
+    for data whose types the database already guarantees.
+    """
+    data = model.model_construct(**{name: getattr(obj, name) for name in model.model_fields})
+    return Response(
+        content=data.model_dump_json(),
+        status_code=status_code,
+        media_type="application/json",
+    )
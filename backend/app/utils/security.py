@@ -2,27 +2,39 @@
 Security utilities for password hashing and JWT token handling.
 """
 
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import UUID
 import bcrypt
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from ..config import get_settings
-from ..database import get_db
 from ..models.user import User
+from .user_loader import user_loader
 
 settings = get_settings()
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
+# Authenticated users keyed by access token hash, so bursts of requests with
+# the same token skip decoding and the users SELECT. Entries never outlive
+# the token itself. Values are (expires_at monotonic time, user).
+_user_cache: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
+    """
+    Verify a password against its hash.
+    
+    bcrypt is deliberately slow and releases the GIL, so async callers should
+    run this (and get_password_hash) in a worker thread.
+    """
     return bcrypt.checkpw(
         plain_password.encode('utf-8'),
         hashed_password.encode('utf-8')
@@ -33,7 +45,7 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     # Truncate to 72 bytes (bcrypt limit)
     password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
     return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
 
 
@@ -67,9 +79,55 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
+def get_token_subject(payload: dict) -> Optional[UUID]:
+    """Extract the user ID from a decoded token payload."""
+    try:
+        return UUID(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _token_cache_key(token: str) -> str:
+    """Hash a raw token so it is not kept in memory as a dict key."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _get_cached_user(key: str) -> Optional[User]:
+    """Return a cached user for a token hash if the entry is still fresh."""
+    entry = _user_cache.get(key)
+    if entry is None:
+        return None
+    
+    expires_at, user = entry
+    if expires_at <= time.monotonic():
+        _user_cache.pop(key, None)
+        return None
+    
+    return user
+
+
+def _cache_user(key: str, user: User, token_exp: Optional[float]) -> None:
+    """Cache a user for a token hash, capped by the token's own expiry."""
+    ttl = settings.user_cache_ttl_seconds
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0:
+        return
+    
+    _user_cache[key] = (time.monotonic() + ttl, user)
+    while len(_user_cache) > settings.user_cache_max_size:
+        _user_cache.popitem(last=False)
+
+
+def invalidate_cached_user(user_id: UUID) -> None:
+    """Drop all cached entries for a user (e.g. after refreshing tokens)."""
+    stale_keys = [key for key, (_, user) in _user_cache.items() if user.id == user_id]
+    for key in stale_keys:
+        del _user_cache[key]
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Get the current authenticated user from JWT token."""
     credentials_exception = HTTPException(
@@ -79,6 +137,12 @@ async def get_current_user(
     )
     
     token = credentials.credentials
+    cache_key = _token_cache_key(token)
+    
+    cached_user = _get_cached_user(cache_key)
+    if cached_user is not None:
+        return cached_user
+    
     payload = decode_token(token)
     
     if payload is None:
@@ -88,15 +152,18 @@ async def get_current_user(
     if payload.get("type") != "access":
         raise credentials_exception
     
-    user_id: str = payload.get("sub")
+    user_id = get_token_subject(payload)
     if user_id is None:
         raise credentials_exception
     
-    # Fetch user from database
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    # Fetch user from database, batched with concurrent lookups. The loader
+    # returns detached users, so a rollback in this request cannot expire
+    # the cached instance.
+    user = await user_loader.load(user_id)
     
     if user is None:
         raise credentials_exception
     
+    _cache_user(cache_key, user, payload.get("exp"))
+    
     return user
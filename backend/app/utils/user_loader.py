@@ -0,0 +1,73 @@
+"""
+Batched user lookups for authentication.
+
+Concurrent requests that miss the token cache in get_current_user are
+coalesced into a single SELECT ... WHERE id IN (...) per event-loop tick.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+from sqlalchemy import select
+
+from ..database import async_session_maker
+from ..models.user import User
+
+
+class UserLoader:
+    """Dataloader that batches user-by-id lookups issued in the same tick."""
+
+    def __init__(self):
+        self._pending: Dict[UUID, List[asyncio.Future]] = {}
+        self._dispatch_scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, user_id: UUID) -> Optional[User]:
+        """
+        Load a user by ID, batched with other lookups in the same tick.
+
+        Returns a detached User, or None if no such user exists.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(user_id, []).append(future)
+
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+
+        return await future
+
+    def _dispatch(self) -> None:
+        """Start a batch query for everything queued so far."""
+        batch, self._pending = self._pending, {}
+        self._dispatch_scheduled = False
+
+        task = asyncio.ensure_future(self._load_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, batch: Dict[UUID, List[asyncio.Future]]) -> None:
+        """Fetch all users in the batch with one query and resolve waiters."""
+        try:
+            # A dedicated short-lived session; closing it detaches the users
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(User).where(User.id.in_(list(batch)))
+                )
+                users = {user.id: user for user in result.scalars()}
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for user_id, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(users.get(user_id))
+
+
+# Singleton instance
+user_loader = UserLoader()
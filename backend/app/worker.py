@@ -0,0 +1,172 @@
+"""
+Celery application for background jobs.
+
+Vector-DB indexing runs here, in a dedicated worker pool, instead of in
+the API process. Start a worker with:
+
+    celery -A app.worker worker --concurrency 1
+
+With the file-based vector store (SQLite development setups), keep a
+single worker process so writes stay serialized; pgvector has no such
+limit. When REDIS_URL is not set, jobs fall back to FastAPI
+BackgroundTasks in the API process.
+
+Indexing is debounced per note: every enqueue records a fresh token under
+embed:<note_id>, and a job only runs if its token is still the latest one
+when its countdown expires. A burst of edits therefore embeds the note
+once, with the content from the last edit. Notes applied together (e.g.
+by one sync request) are indexed together in a single job.
+"""
+
+import asyncio
+import uuid
+from typing import Dict, List, Optional, Set
+import redis
+import redis.asyncio as aioredis
+from celery import Celery
+from fastapi import BackgroundTasks
+
+from .config import get_settings
+from .services.rag_service import DiaryEntry, rag_service
+
+settings = get_settings()
+
+celery_app = Celery("archset", broker=settings.redis_url or None)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_ignore_result=True,
+    # Re-deliver tasks interrupted by a worker restart
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+# Latest debounce token per note, on each side of the broker
+_redis: Optional[aioredis.Redis] = None
+_worker_redis: Optional[redis.Redis] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_local_tokens: Dict[str, str] = {}
+_local_jobs: Set[asyncio.Task] = set()
+
+
+def _debounce_key(note_id: str) -> str:
+    return f"embed:{note_id}"
+
+
+def _get_redis() -> aioredis.Redis:
+    """Get or create the API-side Redis client."""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.Redis.from_url(settings.redis_url)
+    return _redis
+
+
+def _get_worker_redis() -> redis.Redis:
+    """Get or create the worker-side Redis client."""
+    global _worker_redis
+    if _worker_redis is None:
+        _worker_redis = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    return _worker_redis
+
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get or create the worker process's event loop.
+
+    Every job runs on this one loop rather than a fresh asyncio.run() loop:
+    the Gemini client's grpc_asyncio channel is cached per process and bound
+    to the loop it first ran on.
+    """
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    return _worker_loop
+
+
+@celery_app.task(name="archset.sync_diary")
+def sync_diary_task(entries: List[DiaryEntry], tokens: List[str]) -> None:
+    """Embed a batch of diary entries and upsert them into the vector store."""
+    # Drop entries superseded by a later edit of the same note. A missing key
+    # (expired while the job sat in a backlog) still runs, so no edit is ever lost.
+    latest = _get_worker_redis().mget([_debounce_key(entry["note_id"]) for entry in entries])
+    entries = [
+        entry
+        for entry, token, current in zip(entries, tokens, latest)
+        if current is None or current == token
+    ]
+    if entries:
+        _get_worker_loop().run_until_complete(rag_service.sync_diary_batch(entries))
+
+
+async def _sync_diary_debounced(entries: List[DiaryEntry], tokens: List[str]) -> None:
+    """In-process fallback for sync_diary_task, with the same debounce."""
+    await asyncio.sleep(settings.embed_debounce_seconds)
+    current = []
+    for entry, token in zip(entries, tokens):
+        if _local_tokens.get(entry["note_id"]) == token:
+            del _local_tokens[entry["note_id"]]
+            current.append(entry)
+
+    if current:
+        await rag_service.sync_diary_batch(current)
+
+
+async def _start_local_job(entries: List[DiaryEntry], tokens: List[str]) -> None:
+    """
+    Start the in-process job without awaiting it.
+
+    BackgroundTasks run one after another, so waiting out the debounce
+    inside one would delay every task queued behind it.
+    """
+    job = asyncio.create_task(_sync_diary_debounced(entries, tokens))
+    _local_jobs.add(job)
+    job.add_done_callback(_local_jobs.discard)
+
+
+async def enqueue_diary_sync_batch(
+    background_tasks: Optional[BackgroundTasks],
+    entries: List[DiaryEntry]
+) -> None:
+    """
+    Schedule diary entries for vector-DB indexing as a single job.
+
+    Dispatches to the Celery worker when a broker is configured, otherwise
+    runs after the response via the request's BackgroundTasks (if any).
+    Either way the job waits EMBED_DEBOUNCE_SECONDS and skips any note that
+    was re-enqueued in the meantime.
+    """
+    if not entries:
+        return
+
+    tokens = [uuid.uuid4().hex for _ in entries]
+    delay = settings.embed_debounce_seconds
+
+    if settings.redis_url:
+        async with _get_redis().pipeline(transaction=False) as pipe:
+            for entry, token in zip(entries, tokens):
+                # Keep the token around a little longer than the countdown
+                pipe.set(_debounce_key(entry["note_id"]), token, ex=delay + 60)
+            await pipe.execute()
+        # Publishing is a blocking broker round-trip; keep it off the event loop
+        await asyncio.to_thread(
+            sync_diary_task.apply_async, args=[entries, tokens], countdown=delay
+        )
+    elif background_tasks is not None:
+        for entry, token in zip(entries, tokens):
+            _local_tokens[entry["note_id"]] = token
+        background_tasks.add_task(_start_local_job, entries, tokens)
+
+
+async def enqueue_diary_sync(
+    background_tasks: Optional[BackgroundTasks],
+    note_id: str,
+    text: str,
+    user_id: str,
+    title: str = ""
+) -> None:
+    """Schedule a single diary entry for vector-DB indexing."""
+    await enqueue_diary_sync_batch(
+        background_tasks,
+        [DiaryEntry(note_id=note_id, text=text, user_id=user_id, title=title)]
+    )
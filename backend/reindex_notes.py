@@ -7,38 +7,69 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.database import engine, async_session_maker
 from app.models.note import Note
-from app.services.rag_service import rag_service
-from sqlalchemy import select
+from app.services.rag_service import DiaryEntry, rag_service
+from sqlalchemy import select, func
+from tqdm import tqdm
+
+BATCH_SIZE = 64
+# Batches indexed at once; embedding requests are further bounded by EMBED_CONCURRENCY
+CONCURRENT_BATCHES = 4
+
+
+async def index_batch(batch, semaphore: asyncio.Semaphore, progress: tqdm):
+    """Index one batch, then free its slot (acquired by the caller)."""
+    try:
+        # Persisted once at the end instead of after every batch
+        await rag_service.sync_diary_batch(batch, persist=False)
+    except Exception as e:
+        progress.write(f"❌ Failed to index {len(batch)} notes: {e}")
+    finally:
+        semaphore.release()
+    progress.update(len(batch))
+
 
 async def reindex_all_notes():
     print("🔌 Connecting to database...")
     
     async with async_session_maker() as session:
-        print("🔍 Fetching all non-deleted notes...")
-        result = await session.execute(
-            select(Note).where(Note.is_deleted == False)
-        )
-        notes = result.scalars().all()
+        print("🔍 Counting non-deleted notes...")
+        has_content = (Note.is_deleted == False) & (Note.content != "")
+        total = await session.scalar(select(func.count()).where(has_content))
         
-        print(f"📄 Found {len(notes)} notes. Starting re-indexing...")
+        print(f"📄 Found {total} notes. Starting re-indexing...")
         
         # Initialize RAG (ensure storage exists)
         await rag_service.initialize()
         
-        for i, note in enumerate(notes):
-            if not note.content:
-                continue
-                
-            try:
-                print(f"   [{i+1}/{len(notes)}] Indexing note '{note.title}' (ID: {note.id})...")
-                await rag_service.sync_diary_to_vector_db(
-                    note_id=note.id,
-                    text=note.content,
-                    user_id=note.user_id,
-                    title=note.title or "Untitled"
-                )
-            except Exception as e:
-                print(f"❌ Failed to index note {note.id}: {e}")
+        # Stream rows in batches instead of loading every note into memory;
+        # the next batch is fetched while earlier ones are still embedding
+        result = await session.stream(
+            select(Note.id, Note.user_id, Note.title, Note.content)
+            .where(has_content)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        
+        semaphore = asyncio.Semaphore(CONCURRENT_BATCHES)
+        jobs = []
+        with tqdm(total=total, desc="Indexing", unit="note") as progress:
+            async for partition in result.partitions():
+                batch = [
+                    DiaryEntry(
+                        note_id=str(row.id),
+                        text=row.content,
+                        user_id=str(row.user_id),
+                        title=row.title or "Untitled"
+                    )
+                    for row in partition
+                ]
+                # Wait for a free slot before reading further
+                await semaphore.acquire()
+                jobs.append(asyncio.create_task(index_batch(batch, semaphore, progress)))
+            
+            await asyncio.gather(*jobs)
+        
+        print("💾 Saving vector store...")
+        await rag_service.persist()
                 
         print("✅ Re-indexing complete! All notes are now in the local vector store.")
 